@@ -0,0 +1,276 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import openpyxl
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image as PILImage
+from baroncore import read_visible_rows, load_and_process_data, compute_status, build_status_cube
+from baronview import DISPLAY_COLS, build_monthly_chart, sort_task_rows, render_task_table_html
+
+# =========================================================
+# TASK DASHBOARD - TẠO FILE MẪU VÀ ĐO HIỆU NĂNG
+# =========================================================
+#
+# Tạo file tracker giả lập (header dòng 3, cùng các cột như file thật) rồi đo thời gian
+# và bộ nhớ đỉnh của từng bước xử lý / hiển thị. Kết quả ghi dạng JSON để so sánh giữa các lần chạy.
+#
+#   python baronbench.py --rows 20000 --hidden-ratio 0.1 --images 500 --image-size 640x480 --output bench.json
+#   python baronbench.py --rows 20000 --baseline bench.json   # exit code 1 nếu chậm hơn baseline
+
+# === Dữ liệu mẫu ===
+SAMPLE_MODULES = ["Đăng nhập", "Báo cáo", "Thanh toán", "Kho hàng", "Nhân sự", "Khách hàng"]
+SAMPLE_ACTIONS = ["Cập nhật giao diện", "Sửa lỗi", "Thêm chức năng", "Tối ưu", "Kiểm tra"]
+SAMPLE_REQUESTERS = ["An", "Bình", "Cường", "Dung", "Đức", "Hạnh", "Khoa", "Linh"]
+SAMPLE_CONFIRMS = ["GO", "Go ahead", "", "pending", "Chờ duyệt"]
+# Số dòng của 1 trang bảng khi đo render
+BENCH_PAGE_SIZE = 50
+# Ngày cố định cho dữ liệu mẫu và ngày tính STATUS: cùng seed cho cùng dữ liệu / kết quả ở mọi lần chạy
+SAMPLE_BASE_DATE = datetime(2025, 1, 1)
+BENCH_AS_OF = SAMPLE_BASE_DATE + timedelta(days=365)
+
+# === HÀM: Tạo file tracker mẫu ===
+def make_tracker_workbook(path, rows=1000, hidden_ratio=0.1, images=50, image_size=(320, 240), seed=0):
+    """
+    Ghi 1 file Excel giống tracker thật: tiêu đề ở dòng 1, header ở dòng 3, dữ liệu từ dòng 4,
+    một phần các dòng bị ẩn và hình JPEG (nhiễu ngẫu nhiên, dung lượng gần với ảnh chụp) ở cột PICTURE
+    """
+    rnd = random.Random(seed)
+    np_rnd = np.random.default_rng(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Tracker"
+    ws["A1"] = "TASK TRACKER"
+    
+    columns = ["TASK", "Requester", "START DATE", "DUE DATE", "CONFIRM FROM BARON", "PICTURE"]
+    for col_num, name in enumerate(columns, 1):
+        ws.cell(3, col_num, name)
+    
+    base = SAMPLE_BASE_DATE
+    for row_num in range(4, 4 + rows):
+        start = base + timedelta(days=rnd.randint(0, 540))
+        ws.cell(row_num, 1, f"{rnd.choice(SAMPLE_ACTIONS)} {rnd.choice(SAMPLE_MODULES)} #{row_num - 3}")
+        ws.cell(row_num, 2, rnd.choice(SAMPLE_REQUESTERS))
+        ws.cell(row_num, 3, start)
+        ws.cell(row_num, 4, start + timedelta(days=rnd.randint(1, 45)))
+        ws.cell(row_num, 5, rnd.choice(SAMPLE_CONFIRMS))
+        if rnd.random() < hidden_ratio:
+            ws.row_dimensions[row_num].hidden = True
+    
+    for row_num in sorted(rnd.sample(range(4, 4 + rows), min(images, rows))):
+        pixels = np_rnd.integers(0, 256, size=(image_size[1], image_size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        PILImage.fromarray(pixels).save(buffer, "JPEG", quality=80)
+        buffer.seek(0)
+        ws.add_image(XLImage(buffer), f"F{row_num}")
+    
+    wb.save(path)
+
+# === HÀM: Đo 1 bước ===
+def measure(stage, repeat=3):
+    """
+    Chạy stage() repeat lần để lấy thời gian, thêm 1 lần với tracemalloc để lấy bộ nhớ đỉnh
+    (tách riêng vì tracemalloc làm chậm đáng kể)
+    
+    Returns:
+        (kết quả của stage, dict số liệu đo)
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = stage()
+        durations.append(time.perf_counter() - started)
+    
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    return result, {
+        "seconds_min": min(durations),
+        "seconds_median": statistics.median(durations),
+        "peak_mb": peak / 1024 / 1024,
+        "repeat": repeat,
+    }
+
+# === HÀM: Chạy toàn bộ benchmark ===
+def run_benchmark(workbook_path, repeat=3):
+    """
+    Chạy measure_stages với thư mục dữ liệu tạm (xóa khi xong), không ghi vào thư mục dữ liệu thật.
+    BARON_DATA_DIR được trả lại giá trị cũ sau khi chạy.
+    
+    Raises:
+        RuntimeError: baronstore đã được import trước đó với thư mục dữ liệu khác
+    """
+    previous_data_dir = os.environ.get("BARON_DATA_DIR")
+    with tempfile.TemporaryDirectory(prefix="baronbench-", ignore_cleanup_errors=True) as data_dir:
+        # baronstore đọc BARON_DATA_DIR lúc import
+        os.environ["BARON_DATA_DIR"] = data_dir
+        try:
+            import baronstore
+            if baronstore.DATA_DIR != Path(data_dir):
+                raise RuntimeError("baronstore đã được import với thư mục dữ liệu khác, hãy chạy benchmark ở process riêng")
+            return measure_stages(workbook_path, repeat)
+        finally:
+            if previous_data_dir is None:
+                os.environ.pop("BARON_DATA_DIR", None)
+            else:
+                os.environ["BARON_DATA_DIR"] = previous_data_dir
+
+# === HÀM: Đo từng bước ===
+def measure_stages(workbook_path, repeat=3):
+    """
+    Đo các bước: đọc sheet, xử lý dữ liệu, tính STATUS (tại BENCH_AS_OF), cube thống kê, biểu đồ tháng,
+    tìm kiếm, sắp xếp + render 1 trang bảng, lưu và load dữ liệu đã lưu (ghi vào thư mục dữ liệu của baronstore)
+    
+    Returns:
+        Dict {tên bước: số liệu đo}
+    """
+    from baronstore import save_dashboard_data, load_saved_data, clear_saved_data
+    
+    stages = {}
+    
+    def run(name, stage, rows=None, stage_repeat=repeat):
+        result, stats = measure(stage, stage_repeat)
+        if rows is not None:
+            stats["rows"] = rows
+        stages[name] = stats
+        print(f"{name:<24} {stats['seconds_median'] * 1000:10.1f} ms {stats['peak_mb']:10.1f} MB", file=sys.stderr)
+        return result
+    
+    _, _, _, total_count, _ = run("read_visible_rows", lambda: read_visible_rows(workbook_path))
+    stages["read_visible_rows"]["rows"] = total_count
+    df, images, thumbnails, search_index, visible_count, _ = run(
+        "load_and_process_data", lambda: load_and_process_data(workbook_path)
+    )
+    stages["load_and_process_data"]["rows"] = visible_count
+    stages["load_and_process_data"]["images"] = len(images)
+    
+    as_of = pd.Timestamp(BENCH_AS_OF)
+    status = run("compute_status", lambda: compute_status(df, as_of), rows=len(df))
+    df = df.assign(STATUS=status)
+    cube = run("build_status_cube", lambda: build_status_cube(df), rows=len(df))
+    run("build_monthly_chart", lambda: build_monthly_chart(cube), rows=len(cube))
+    
+    query = str(df["TASK"].iloc[0]).split()[0] if len(df) else ""
+    rows = run("search", lambda: search_index.search(query), rows=len(df))
+    stages["search"]["matches"] = len(rows)
+    all_rows = np.arange(len(df))
+    sorted_rows = run("sort_task_rows", lambda: sort_task_rows(df, all_rows, "TASK"), rows=len(df))
+    run(
+        "render_table_page",
+        lambda: render_task_table_html(df.iloc[sorted_rows[:BENCH_PAGE_SIZE]], DISPLAY_COLS),
+        rows=min(BENCH_PAGE_SIZE, len(df))
+    )
+    
+    upload_time = datetime.now()
+    
+    def save():
+        # Xóa trước mỗi lần để đo ghi toàn bộ, không phải ghi nối hình đã có
+        clear_saved_data()
+        save_dashboard_data(df.drop(columns=["STATUS"]), images, thumbnails, search_index, upload_time, Path(workbook_path).name)
+    
+    run("save_dashboard_data", save, rows=len(df))
+    run("load_saved_data", load_saved_data, rows=len(df))
+    return stages
+
+# === HÀM: So sánh với baseline ===
+def find_regressions(stages, baseline_stages, max_regression):
+    """
+    Returns:
+        List (tên bước, thời gian baseline, thời gian hiện tại) của các bước chậm hơn baseline
+        quá max_regression (tỉ lệ, so trên thời gian nhỏ nhất)
+    """
+    regressions = []
+    for name, stats in stages.items():
+        baseline = baseline_stages.get(name)
+        if baseline is None:
+            continue
+        if stats["seconds_min"] > baseline["seconds_min"] * (1 + max_regression):
+            regressions.append((name, baseline["seconds_min"], stats["seconds_min"]))
+    return regressions
+
+# === HÀM: Chạy từ dòng lệnh ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo file tracker mẫu và đo hiệu năng Task Dashboard")
+    parser.add_argument("--rows", type=int, default=5000, help="Số dòng task")
+    parser.add_argument("--hidden-ratio", type=float, default=0.1, help="Tỉ lệ dòng bị ẩn (0-1)")
+    parser.add_argument("--images", type=int, default=100, help="Số hình nhúng trong cột PICTURE")
+    parser.add_argument("--image-size", default="320x240", help="Kích thước hình, dạng RỘNGxCAO")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi bước")
+    parser.add_argument("--workbook", help="Dùng file Excel có sẵn thay vì tạo file mẫu")
+    parser.add_argument("--keep-workbook", help="Lưu file mẫu đã tạo ra đường dẫn này")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file (default=stdout)")
+    parser.add_argument("--baseline", help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Cho phép chậm hơn baseline tối đa (tỉ lệ)")
+    args = parser.parse_args(argv)
+    
+    width, height = (int(value) for value in args.image_size.lower().split("x"))
+    params = {
+        "rows": args.rows,
+        "hidden_ratio": args.hidden_ratio,
+        "images": args.images,
+        "image_size": [width, height],
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "workbook": args.workbook,
+    }
+    
+    # File mẫu không giữ lại (--keep-workbook) được xóa cùng thư mục tạm khi đo xong
+    with tempfile.TemporaryDirectory(prefix="baronbench-") as work_dir:
+        if args.workbook:
+            workbook_path = args.workbook
+        else:
+            workbook_path = args.keep_workbook or os.path.join(work_dir, "tracker.xlsx")
+            started = time.perf_counter()
+            make_tracker_workbook(workbook_path, args.rows, args.hidden_ratio, args.images, (width, height), args.seed)
+            print(f"Tạo file mẫu: {time.perf_counter() - started:.1f}s -> {workbook_path}", file=sys.stderr)
+        params["workbook_bytes"] = os.path.getsize(workbook_path)
+        
+        results = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "environment": {
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "openpyxl": openpyxl.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            "params": params,
+            "stages": run_benchmark(workbook_path, args.repeat),
+        }
+    
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+    
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("params", {}).get("rows") != params["rows"]:
+            print("⚠️ Baseline được đo với số dòng khác", file=sys.stderr)
+        regressions = find_regressions(results["stages"], baseline["stages"], args.max_regression)
+        for name, before, after in regressions:
+            print(f"CHẬM HƠN: {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import io
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from baroncore import list_sheet_names
+from baronmetrics import StageRecorder, write_metrics
+from baronstore import (
+    METRICS_BUILD_FILE, METRICS_LOG_FILE, DEFAULT_DATASET, dataset_dir,
+    load_saved_data, read_saved_meta, load_and_process_jobs, hash_jobs, publish_result,
+)
+
+# =========================================================
+# TASK DASHBOARD - TẠO DỮ LIỆU DASHBOARD TỪ DÒNG LỆNH
+# =========================================================
+#
+# Xử lý tất cả file .xlsx trong 1 thư mục thành bộ dữ liệu mà web chỉ việc mở
+# (bảng task, kho hình, thumbnail, chỉ mục tìm kiếm, cube thống kê). Không import Streamlit.
+#
+#   python baronbuild.py <thư mục file Excel> [--jobs N] [--all-sheets] [--force] [--dataset TÊN]
+#
+# Chạy trong cùng thư mục với web (hoặc đặt BARON_DATA_DIR giống nhau) để web thấy dữ liệu mới.
+
+# === HÀM: Tìm file Excel đầu vào ===
+def find_input_files(input_dir):
+    """Các file .xlsx trong input_dir (bỏ file khóa ~$ của Excel), sắp theo tên"""
+    return sorted(
+        path for path in Path(input_dir).glob("*.xlsx")
+        if path.is_file() and not path.name.startswith("~$")
+    )
+
+# === HÀM: Tạo danh sách job ===
+def build_jobs(paths, all_sheets=False):
+    """
+    Returns:
+        (list (tên file, bytes, tên sheet): sheet đang active của mỗi file, hoặc mọi sheet nếu all_sheets;
+         list (tên file, thông báo lỗi) của các file không mở được)
+    """
+    jobs = []
+    errors = []
+    for path in paths:
+        try:
+            file_bytes = path.read_bytes()
+            sheet_names, active_sheet = list_sheet_names(io.BytesIO(file_bytes))
+        except Exception as e:
+            errors.append((path.name, f"{type(e).__name__}: {e}"))
+            continue
+        for sheet_name in (sheet_names if all_sheets else [active_sheet]):
+            jobs.append((path.name, file_bytes, sheet_name))
+    return jobs, errors
+
+# === HÀM: Tạo dữ liệu ===
+def build(args, paths, recorder):
+    """Xử lý các file paths và lưu bộ dữ liệu mới; trả về exit code"""
+    started = time.perf_counter()
+    with recorder.stage("read_inputs", rows=len(paths)):
+        jobs, errors = build_jobs(paths, args.all_sheets)
+    for name, message in errors:
+        print(f"{name}: LỖI: {message}", file=sys.stderr)
+    if errors:
+        return 1
+    
+    file_hash = hash_jobs(jobs)
+    saved_meta = read_saved_meta(args.dataset)
+    if not args.force and saved_meta is not None and saved_meta.get("file_hash") == file_hash:
+        print("Dữ liệu đầu vào không đổi, bỏ qua")
+        return 0
+    
+    with recorder.stage("load_saved_data"):
+        previous = load_saved_data(args.dataset)
+    
+    def report_progress(done, total, label, error):
+        status = f"LỖI: {type(error).__name__}: {error}" if error is not None else "OK"
+        print(f"[{done}/{total}] {label}: {status}", flush=True)
+    
+    # Job không đổi lấy từ cache xử lý, chỉ job mới / đã sửa mới chạy trên process pool
+    result, errors = load_and_process_jobs(
+        jobs,
+        on_progress=report_progress,
+        known_image_refs=frozenset(previous["thumbnails"].keys()) if previous is not None else frozenset(),
+        max_workers=args.jobs,
+        recorder=recorder,
+    )
+    if errors:
+        # Không lưu bộ dữ liệu thiếu file: lần chạy sau sẽ thử lại
+        print(f"{len(errors)} / {len(jobs)} job lỗi, không cập nhật dữ liệu", file=sys.stderr)
+        return 1
+    
+    uploaded_filename = ", ".join(dict.fromkeys(name for name, _, _ in jobs))
+    changes = publish_result(
+        result, previous, datetime.now(), uploaded_filename, file_hash, recorder=recorder, name=args.dataset
+    )
+    counts = changes["CHANGE"].value_counts()
+    print(
+        f"Đã lưu {result[4]} / {result[5]} task visible từ {len(jobs)} sheet "
+        f"(+{counts.get('Added', 0)} / -{counts.get('Removed', 0)} / ~{counts.get('Changed', 0)}) "
+        f"trong {time.perf_counter() - started:.1f}s"
+    )
+    return 0
+
+# === HÀM: Chạy từ dòng lệnh ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo dữ liệu Task Dashboard từ 1 thư mục file Excel")
+    parser.add_argument("input_dir", help="Thư mục chứa các file .xlsx (header ở dòng 3)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Số process xử lý song song (default=số CPU)")
+    parser.add_argument("--all-sheets", action="store_true", help="Xử lý mọi sheet thay vì chỉ sheet đang active")
+    parser.add_argument("--force", action="store_true", help="Tạo lại kể cả khi file đầu vào không đổi")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help=f"Tên bộ dữ liệu được lưu (default={DEFAULT_DATASET})")
+    args = parser.parse_args(argv)
+    try:
+        dataset_dir(args.dataset)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    
+    paths = find_input_files(args.input_dir)
+    if not paths:
+        print(f"Không tìm thấy file .xlsx trong {args.input_dir}", file=sys.stderr)
+        return 2
+    
+    # Thời gian / bộ nhớ từng bước ghi vào METRICS_BUILD_FILE + METRICS_LOG_FILE
+    recorder = StageRecorder("build", label=str(args.input_dir))
+    try:
+        return build(args, paths, recorder)
+    finally:
+        write_metrics(recorder, METRICS_BUILD_FILE, METRICS_LOG_FILE)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,749 @@
+import pandas as pd
+import numpy as np
+import openpyxl
+from openpyxl.worksheet._reader import WorkSheetParser
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.relationship import get_rels_path, get_dependents
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.xml.constants import SHEET_DRAWING_NS, DRAWING_NS, REL_NS
+from openpyxl.xml.functions import fromstring
+import io
+from PIL import Image as PILImage
+import bisect
+import hashlib
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from baronmetrics import StageRecorder
+
+# =========================================================
+# TASK DASHBOARD - XỬ LÝ DỮ LIỆU (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# === Thumbnail ===
+THUMBNAIL_MAX_SIZE = (360, 360)
+
+# === Hình của task ===
+# Các khóa hình của 1 task trong PICTURE_REF, theo thứ tự dòng / cột của ô neo
+PICTURE_REF_SEP = " "
+
+# Chữ ký đầu file -> (định dạng, MIME type)
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", ("PNG", "image/png")),
+    (b"\xff\xd8\xff", ("JPEG", "image/jpeg")),
+    (b"GIF87a", ("GIF", "image/gif")),
+    (b"GIF89a", ("GIF", "image/gif")),
+    (b"BM", ("BMP", "image/bmp")),
+    (b"II*\x00", ("TIFF", "image/tiff")),
+    (b"MM\x00*", ("TIFF", "image/tiff")),
+    (b"\xd7\xcd\xc6\x9a", ("WMF", "image/wmf")),
+]
+
+# === Tìm kiếm TASK ===
+# Bảng bỏ dấu: xóa các dấu kết hợp (sau khi tách NFD) và đổi đ/Đ -> d/D
+SEARCH_FOLD_TABLE = {codepoint: None for codepoint in range(0x300, 0x370)}
+SEARCH_FOLD_TABLE.update({ord("đ"): "d", ord("Đ"): "D"})
+SEARCH_WORD_RE = re.compile(r"\w+")
+
+# === So sánh 2 lần upload ===
+# Khóa ổn định của 1 task giữa các lần upload
+TASK_KEY_COLS = ["TASK", "Requester", "START DATE"]
+# Các cột không đem ra so sánh (tính lại lúc hiển thị / chỉ là nguồn của task)
+DIFF_IGNORE_COLS = {"STATUS", "SOURCE FILE", "SHEET"}
+
+# === Bảng task trong bộ nhớ ===
+# Cột ít giá trị khác nhau: lưu dạng category (mã số nguyên + bảng giá trị duy nhất)
+CATEGORY_COLS = ["Requester", "CONFIRM FROM BARON", "PICTURE_REF", "SOURCE FILE", "SHEET"]
+DATE_COLS = ["START DATE", "DUE DATE"]
+# Bảng giá trị của cột STATUS do compute_status trả về (theo ABC như khi còn là chuỗi)
+STATUS_LABELS = ["Completed", "Delay", "New Task", "Working"]
+
+# === HÀM: Hash nội dung file upload ===
+def hash_file_bytes(file_bytes):
+    """Tính hash SHA-256 của nội dung file, dùng làm khóa cache"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+# === HÀM: Hash nội dung hình ảnh ===
+def hash_image_bytes(img_bytes):
+    """Khóa của hình trong kho ảnh: hình trùng nội dung chỉ lưu 1 lần"""
+    return hashlib.sha1(img_bytes).hexdigest()
+
+# === HÀM: Tách các khóa hình của 1 task ===
+def split_picture_refs(value):
+    """List khóa hình trong 1 ô PICTURE_REF (rỗng nếu task không có hình)"""
+    return value.split(PICTURE_REF_SEP) if isinstance(value, str) and value else []
+
+# === HÀM: Nhận diện định dạng hình ===
+def detect_image_format(img_bytes):
+    """
+    Nhận diện định dạng hình theo chữ ký đầu file
+    
+    Returns:
+        (định dạng, MIME type), ví dụ ("PNG", "image/png"); ("UNKNOWN", "application/octet-stream") nếu không rõ
+    """
+    head = bytes(img_bytes[:44])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP", "image/webp"
+    if head[40:44] == b" EMF":
+        return "EMF", "image/emf"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return "UNKNOWN", "application/octet-stream"
+
+# === HÀM: Tạo thumbnail ===
+def make_thumbnail(img_bytes, max_size=THUMBNAIL_MAX_SIZE):
+    """
+    Thu nhỏ hình về tối đa max_size (giữ tỉ lệ)
+    
+    Hình đã đủ nhỏ hoặc không đọc được bằng Pillow (WMF/EMF...) thì giữ nguyên bytes gốc
+    """
+    try:
+        with PILImage.open(io.BytesIO(img_bytes)) as img:
+            if img.width <= max_size[0] and img.height <= max_size[1]:
+                return img_bytes
+            img.thumbnail(max_size)
+            buf = io.BytesIO()
+            if img.mode in ("RGBA", "LA", "P"):
+                img.save(buf, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(buf, format="JPEG", quality=80)
+            return buf.getvalue()
+    except Exception:
+        return img_bytes
+
+# === HÀM: Chuẩn hóa chuỗi tìm kiếm ===
+def normalize_search_text(text):
+    """Bỏ dấu tiếng Việt và chữ hoa/thường, vd: "Cập nhật Đơn" -> "cap nhat don" """
+    return unicodedata.normalize("NFD", str(text)).translate(SEARCH_FOLD_TABLE).casefold()
+
+def tokenize_search_text(text):
+    """Tách chuỗi thành các từ đã chuẩn hóa (tách từ trước, bỏ dấu từng từ sau)"""
+    return [normalize_search_text(word) for word in SEARCH_WORD_RE.findall(unicodedata.normalize("NFC", str(text)))]
+
+# === Chỉ mục tìm kiếm TASK ===
+class TaskSearchIndex:
+    """
+    Inverted index từ -> các vị trí dòng (iloc) có chứa từ đó, dạng CSR:
+    tokens đã sắp xếp, postings[offsets[i]:offsets[i + 1]] là các dòng của tokens[i].
+    Tìm kiếm không phân biệt dấu/hoa thường, hỗ trợ khớp đầu từ và nhiều từ (AND).
+    """
+    
+    def __init__(self, tokens, offsets, postings, row_count):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.postings = postings
+        self.row_count = row_count
+    
+    @classmethod
+    def build(cls, texts):
+        """Tạo index từ cột TASK"""
+        row_lists = {}
+        folded_words = {}
+        row_count = 0
+        for pos, text in enumerate(texts):
+            row_count += 1
+            if text is None or (isinstance(text, float) and np.isnan(text)):
+                continue
+            # Các từ lặp lại rất nhiều giữa các task -> chỉ bỏ dấu mỗi từ 1 lần
+            row_tokens = set()
+            for word in set(SEARCH_WORD_RE.findall(unicodedata.normalize("NFC", str(text)))):
+                token = folded_words.get(word)
+                if token is None:
+                    token = folded_words[word] = normalize_search_text(word)
+                row_tokens.add(token)
+            for token in row_tokens:
+                row_lists.setdefault(token, []).append(pos)
+        
+        tokens = sorted(row_lists)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(row_lists[token]) for token in tokens])
+        postings = np.fromiter(
+            (pos for token in tokens for pos in row_lists[token]), dtype=np.int32, count=int(offsets[-1])
+        )
+        return cls(tokens, offsets, postings, row_count)
+    
+    @classmethod
+    def merge(cls, indexes):
+        """Gộp index của nhiều bảng nối tiếp nhau (vị trí dòng được cộng dồn theo thứ tự)"""
+        row_arrays = {}
+        row_offset = 0
+        for index in indexes:
+            for i, token in enumerate(index.tokens):
+                rows = index.postings[index.offsets[i]:index.offsets[i + 1]]
+                row_arrays.setdefault(token, []).append(rows + row_offset)
+            row_offset += index.row_count
+        
+        tokens = sorted(row_arrays)
+        arrays = [np.concatenate(row_arrays[token]) for token in tokens]
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(rows) for rows in arrays])
+        postings = np.concatenate(arrays).astype(np.int32) if arrays else np.zeros(0, dtype=np.int32)
+        return cls(tokens, offsets, postings, row_offset)
+    
+    def _token_range(self, term, prefix):
+        """Khoảng [lo, hi) trong tokens của các từ khớp term"""
+        lo = bisect.bisect_left(self.tokens, term)
+        if prefix:
+            # Các từ bắt đầu bằng term nằm liền nhau trong danh sách đã sắp xếp
+            hi = bisect.bisect_left(self.tokens, term + "\U0010ffff", lo)
+        else:
+            hi = lo + 1 if lo < len(self.tokens) and self.tokens[lo] == term else lo
+        return lo, hi
+    
+    def _range_mask(self, lo, hi):
+        """Mask theo dòng của các từ tokens[lo:hi] (hợp các postings không cần sắp xếp / np.unique)"""
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[self.postings[self.offsets[lo]:self.offsets[hi]]] = True
+        return mask
+    
+    def search(self, query, prefix=True):
+        """
+        Tìm các dòng chứa TẤT CẢ các từ trong query
+        
+        Returns:
+            Mảng vị trí dòng (iloc) đã sắp xếp, hoặc None nếu query không có từ nào
+        """
+        terms = tokenize_search_text(query)
+        if not terms:
+            return None
+        # Từ ít postings nhất trước (đếm từ offsets, chưa phải đọc postings): kết quả thu hẹp nhanh nhất
+        ranges = sorted(
+            (self._token_range(term, prefix) for term in set(terms)),
+            key=lambda token_range: self.offsets[token_range[1]] - self.offsets[token_range[0]]
+        )
+        lo, hi = ranges[0]
+        # Kết quả giữ dạng mảng dòng (từ đầu là 1 từ: postings đã sắp xếp, không trùng)
+        # hoặc dạng mask theo dòng (từ đầu là nhiều từ khớp tiền tố)
+        rows = self.postings[self.offsets[lo]:self.offsets[hi]] if hi - lo <= 1 else None
+        mask = self._range_mask(lo, hi) if rows is None else None
+        for lo, hi in ranges[1:]:
+            if rows is not None and len(rows) == 0:
+                break
+            if rows is not None and hi - lo == 1 and len(rows) * 8 < self.offsets[hi] - self.offsets[lo]:
+                # Còn ít dòng: tra nhị phân trong postings đã sắp xếp của từ này
+                other = self.postings[self.offsets[lo]:self.offsets[hi]]
+                rows = rows[other[np.minimum(np.searchsorted(other, rows), len(other) - 1)] == rows]
+            elif rows is not None:
+                rows = rows[self._range_mask(lo, hi)[rows]]
+            else:
+                mask &= self._range_mask(lo, hi)
+        if rows is None:
+            rows = np.flatnonzero(mask).astype(self.postings.dtype)
+        return rows
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                tokens=np.array(self.tokens, dtype=str),
+                offsets=self.offsets,
+                postings=self.postings,
+                row_count=np.array(self.row_count),
+            )
+    
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["tokens"].tolist(), data["offsets"], data["postings"], int(data["row_count"]))
+
+def read_anchor_marker(marker):
+    """(dòng, cột, offset trong dòng) của 1 ô neo <from> / <to> (dòng / cột đánh số từ 1)"""
+    return (
+        int(marker.findtext(f"{{{SHEET_DRAWING_NS}}}row")) + 1,
+        int(marker.findtext(f"{{{SHEET_DRAWING_NS}}}col")) + 1,
+        int(marker.findtext(f"{{{SHEET_DRAWING_NS}}}rowOff") or 0),
+    )
+
+# === HÀM: Đọc vị trí hình ảnh trong sheet ===
+def read_image_anchors(archive, worksheet_path):
+    """
+    Đọc các hình ảnh nhúng trong sheet trực tiếp từ file xlsx (không cần Pillow)
+    
+    Args:
+        archive: ZipFile của workbook (wb._archive khi read_only=True)
+        worksheet_path: Đường dẫn XML của sheet trong archive
+    
+    Returns:
+        List (dòng đầu, dòng cuối, cột đầu, bytes hình ảnh) theo vùng ô mà hình phủ lên
+        (đánh số từ 1; hình neo 1 ô: dòng cuối = dòng đầu; hình neo tọa độ tuyệt đối bị bỏ qua)
+    """
+    anchors = []
+    names = set(archive.namelist())
+    rels_path = get_rels_path(worksheet_path)
+    if rels_path not in names:
+        return anchors
+    
+    # Đọc thẳng XML của drawing (không dựng object openpyxl cho từng shape),
+    # quan hệ rId -> file hình tra bằng dict: thời gian tuyến tính theo số hình
+    media = {}
+    sheet_rels = get_dependents(archive, rels_path)
+    for drawing_rel in sheet_rels.find(SpreadsheetDrawing._rel_type):
+        drawing_rels_path = get_rels_path(drawing_rel.target)
+        if drawing_rel.target not in names or drawing_rels_path not in names:
+            continue
+        drawing = fromstring(archive.read(drawing_rel.target))
+        targets = {rel.Id: rel.target for rel in get_dependents(archive, drawing_rels_path)}
+        
+        for anchor in drawing:
+            try:
+                from_row, from_col, _ = read_anchor_marker(anchor.find(f"{{{SHEET_DRAWING_NS}}}from"))
+                last_row = from_row
+                to_marker = anchor.find(f"{{{SHEET_DRAWING_NS}}}to")
+                if to_marker is not None:
+                    # Ô "to" có offset 0 nghĩa là hình kết thúc ngay mép trên ô đó
+                    to_row, _, to_row_offset = read_anchor_marker(to_marker)
+                    last_row = max(from_row, to_row if to_row_offset else to_row - 1)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            
+            # Hình trong group shape dùng chung vùng ô của group
+            for blip in anchor.iterfind(f".//{{{SHEET_DRAWING_NS}}}pic/{{{SHEET_DRAWING_NS}}}blipFill/{{{DRAWING_NS}}}blip"):
+                target = targets.get(blip.get(f"{{{REL_NS}}}embed"))
+                if target is None or target not in names:
+                    continue
+                if target not in media:
+                    media[target] = archive.read(target)
+                anchors.append((from_row, last_row, from_col, media[target]))
+    
+    return anchors
+
+# === HÀM: Gắn hình vào dòng task ===
+def map_image_anchors(anchors, row_owner, first_row):
+    """
+    Gắn mỗi hình vào dòng task visible đầu tiên trong vùng ô mà hình phủ lên
+    (tra row_owner O(1) mỗi dòng, tổng thời gian tuyến tính theo số hình)
+    
+    Args:
+        anchors: List vùng ô của các hình (xem read_image_anchors)
+        row_owner: Vị trí dòng visible "sở hữu" từng dòng Excel, bắt đầu từ dòng first_row:
+            dòng task -> chính nó, dòng trống / ô merge bên dưới -> task phía trên,
+            dòng ẩn (và dòng trống bên dưới nó) / trước task đầu tiên -> -1.
+            Dòng sau cuối list không thuộc task nào (hình nằm hẳn dưới bảng bị bỏ qua)
+        first_row: Số dòng Excel của row_owner[0]
+    
+    Returns:
+        Dict {vị trí dòng visible: [bytes hình ảnh, ...]} theo thứ tự dòng / cột của ô neo
+    """
+    last_row = first_row + len(row_owner) - 1
+    placed = {}
+    for from_row, to_row, from_col, img_bytes in anchors:
+        for row_num in range(max(from_row, first_row), min(to_row, last_row) + 1):
+            owner = row_owner[row_num - first_row]
+            if owner >= 0:
+                placed.setdefault(owner, []).append((from_row, from_col, img_bytes))
+                break
+    # Mỗi task chỉ vài hình: sắp trong từng task vẫn giữ thời gian tuyến tính
+    return {
+        owner: [img_bytes for _, _, img_bytes in sorted(row_images, key=lambda item: item[:2])]
+        for owner, row_images in placed.items()
+    }
+
+# === HÀM: Đọc sheet 1 lần (streaming) ===
+def read_visible_rows(uploaded_file, header_row=3, sheet_name=None):
+    """
+    Đọc sheet theo kiểu streaming, bỏ qua các dòng BỊ ẨN ngay khi đọc
+    
+    Args:
+        uploaded_file: File Excel (đường dẫn hoặc file-like)
+        header_row: Dòng header (default=3)
+        sheet_name: Tên sheet cần đọc (default=sheet đang active)
+    
+    Returns:
+        (columns, row_numbers, row_images, total_count, sheet_title)
+        - columns: Dict {tên cột: list giá trị} chỉ gồm các dòng visible
+        - row_numbers: Số dòng Excel tương ứng với từng phần tử trong columns
+        - row_images: Dict hình ảnh theo vị trí dòng visible, gồm mọi hình phủ lên dòng task
+          ở bất kỳ cột nào, kể cả ô merge / dòng trống bên dưới (xem map_image_anchors)
+        - total_count: Tổng số dòng dữ liệu (kể cả dòng ẩn)
+        - sheet_title: Tên sheet đã đọc
+    """
+    wb = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.active
+        sheet_title = ws.title
+        anchors = read_image_anchors(wb._archive, ws._worksheet_path)
+        
+        header = []
+        values = []
+        row_numbers = []
+        total_count = 0
+        # Chỉ mục dòng Excel -> dòng visible (xem map_image_anchors), bắt đầu từ dòng sau header
+        row_owner = []
+        owner = -1
+        
+        with ws._get_source() as src:
+            parser = WorkSheetParser(
+                src, ws._shared_strings,
+                data_only=True,
+                epoch=wb.epoch,
+                date_formats=wb._date_formats,
+                timedelta_formats=wb._timedelta_formats,
+            )
+            for row_num, cells in parser.parse():
+                if row_num == header_row:
+                    header = [None] * (max((c["column"] for c in cells), default=0))
+                    for c in cells:
+                        header[c["column"] - 1] = c["value"]
+                    values = [[] for _ in header]
+                    continue
+                if row_num < header_row or not header:
+                    continue
+                
+                total_count = row_num - header_row
+                # Dòng không có trong XML (trống) thuộc về task phía trên
+                row_owner.extend([owner] * (row_num - header_row - 1 - len(row_owner)))
+                dims = parser.row_dimensions.pop(str(row_num), None)
+                if dims and dims.get("hidden") in ("1", "true"):
+                    owner = -1
+                    row_owner.append(owner)
+                    continue
+                if all(c["value"] is None for c in cells):
+                    row_owner.append(owner)
+                    continue
+                owner = len(row_numbers)
+                row_owner.append(owner)
+                
+                row_values = [None] * len(header)
+                for c in cells:
+                    if c["column"] <= len(header):
+                        row_values[c["column"] - 1] = c["value"]
+                for col_values, value in zip(values, row_values):
+                    col_values.append(value)
+                row_numbers.append(row_num)
+            
+            # Vùng merge bắt đầu ở 1 dòng task thuộc về task đó đến hết vùng,
+            # kể cả các dòng sau dòng cuối có trong XML (dòng không có trong XML chưa thuộc task nào)
+            merged_ranges = parser.merged_cells.mergeCell if parser.merged_cells is not None else []
+            for merged in merged_ranges:
+                _, min_row, _, max_row = range_boundaries(merged.ref)
+                start = min_row - header_row - 1
+                if start < 0 or start >= len(row_owner) or row_owner[start] < 0:
+                    continue
+                row_owner.extend([-1] * (max_row - header_row - len(row_owner)))
+                for idx in range(start + 1, max_row - header_row):
+                    if row_owner[idx] < 0:
+                        row_owner[idx] = row_owner[start]
+    finally:
+        wb.close()
+    row_images = map_image_anchors(anchors, row_owner, header_row + 1)
+    
+    # Tên cột giống pd.read_excel: strip, cột trống -> "Unnamed: i", trùng -> ".1"
+    columns = {}
+    for idx, (name, col_values) in enumerate(zip(header, values)):
+        name = str(name).strip() if name is not None else f"Unnamed: {idx}"
+        unique_name, dup = name, 0
+        while unique_name in columns:
+            dup += 1
+            unique_name = f"{name}.{dup}"
+        columns[unique_name] = col_values
+    
+    return columns, row_numbers, row_images, total_count, sheet_title
+
+# === HÀM: Load và xử lý dữ liệu ===
+def load_and_process_data(uploaded_file, sheet_name=None, source_name=None, known_image_refs=frozenset(), recorder=None):
+    """
+    Load và xử lý CHỈ dữ liệu VISIBLE từ Excel file (đọc file 1 lần duy nhất)
+    
+    STATUS không được tính ở đây mà tính lúc hiển thị bằng compute_status.
+    Chỉ mục tìm kiếm TASK được tạo luôn ở bước này.
+    
+    Args:
+        uploaded_file: File Excel (đường dẫn hoặc file-like)
+        sheet_name: Tên sheet cần đọc (default=sheet đang active)
+        source_name: Tên file gốc, ghi vào cột SOURCE FILE
+        known_image_refs: Khóa các hình đã có thumbnail trong dữ liệu đã lưu
+            (không tạo lại, xem complete_thumbnails)
+        recorder: StageRecorder ghi thời gian / bộ nhớ từng bước (None = không ghi)
+    """
+    recorder = recorder if recorder is not None else StageRecorder("ingest")
+    
+    # Đọc sheet 1 lần: dữ liệu visible + vị trí hình ảnh
+    with recorder.stage("read_sheet") as record:
+        columns, visible_row_numbers, row_images, total_count, sheet_title = read_visible_rows(
+            uploaded_file, header_row=3, sheet_name=sheet_name
+        )
+        record["rows"] = total_count
+    df = pd.DataFrame(columns)
+    
+    # Lưu hình ảnh dạng bytes gốc (chỉ từ các dòng visible), khóa = hash nội dung
+    with recorder.stage("hash_images") as record:
+        images = {}
+        picture_refs = [""] * len(visible_row_numbers)
+        for position, task_images in row_images.items():
+            refs = []
+            for img_bytes in task_images:
+                ref = hash_image_bytes(img_bytes)
+                images.setdefault(ref, img_bytes)
+                refs.append(ref)
+            # Cùng 1 hình dán nhiều lần trong task chỉ giữ 1 khóa
+            picture_refs[position] = PICTURE_REF_SEP.join(dict.fromkeys(refs))
+        record["rows"] = len(images)
+    
+    # Thumbnail tạo 1 lần cho mỗi hình (đã loại trùng), bỏ qua hình đã có từ lần upload trước
+    with recorder.stage("thumbnails") as record:
+        thumbnails = {
+            ref: make_thumbnail(img_bytes) for ref, img_bytes in images.items() if ref not in known_image_refs
+        }
+        record["rows"] = len(thumbnails)
+    
+    # Thêm cột PICTURE_REF: các khóa hình trong images ("" nếu task không có hình, xem split_picture_refs)
+    df["PICTURE_REF"] = picture_refs
+    
+    # Nguồn của từng task khi gộp nhiều file / sheet
+    df["SOURCE FILE"] = source_name or getattr(uploaded_file, "name", str(uploaded_file))
+    df["SHEET"] = sheet_title
+    df = compact_task_frame(df)
+    
+    # Chỉ mục tìm kiếm TASK (không dấu, không phân biệt hoa/thường)
+    with recorder.stage("search_index", rows=len(df)):
+        search_index = TaskSearchIndex.build(df["TASK"]) if "TASK" in df else TaskSearchIndex.build([None] * len(df))
+    
+    return df, images, thumbnails, search_index, len(visible_row_numbers), total_count
+
+# === HÀM: Thu gọn bảng task trong bộ nhớ ===
+def compact_task_frame(df):
+    """
+    Cột ngày -> datetime64, cột CATEGORY_COLS -> category (PICTURE_REF thành mã số nguyên
+    trỏ tới khóa hình trong kho hình, mỗi hình chỉ lưu 1 lần). Cột đã đúng kiểu được giữ nguyên.
+    
+    Returns:
+        DataFrame mới (không sửa df)
+    """
+    df = df.copy(deep=False)
+    for col in DATE_COLS:
+        if col in df and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in CATEGORY_COLS:
+        if col in df and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Ô lẫn số / chữ được ép về chuỗi như khi lưu Arrow (xem to_arrow_table)
+            values = df[col]
+            df[col] = values.where(values.isna(), values.astype(str)).astype("category")
+    return df
+
+def decategorize(values):
+    """Series category -> object (để so sánh / điền ô trống bằng giá trị ngoài bảng giá trị)"""
+    return values.astype(object) if isinstance(values.dtype, pd.CategoricalDtype) else values
+
+# === HÀM: Danh sách sheet ===
+def list_sheet_names(uploaded_file):
+    """
+    Returns:
+        (danh sách tên sheet, tên sheet đang active)
+    """
+    wb = openpyxl.load_workbook(uploaded_file, read_only=True)
+    try:
+        return wb.sheetnames, wb.active.title
+    finally:
+        wb.close()
+
+# === HÀM: Xử lý 1 sheet (chạy trong process con) ===
+def process_sheet_job(file_name, file_bytes, sheet_name, known_image_refs=frozenset()):
+    """
+    Xử lý 1 sheet của 1 workbook; phải là hàm top-level để gửi được sang process con
+    
+    Returns:
+        (kết quả load_and_process_data, list số liệu từng bước của StageRecorder)
+    """
+    recorder = StageRecorder("ingest")
+    result = load_and_process_data(
+        io.BytesIO(file_bytes), sheet_name=sheet_name, source_name=file_name,
+        known_image_refs=known_image_refs, recorder=recorder
+    )
+    return result, recorder.records
+
+# === HÀM: Xử lý nhiều workbook / sheet song song ===
+def ingest_in_parallel(jobs, max_workers=None, known_image_refs=frozenset()):
+    """
+    Xử lý song song nhiều job (tên file, bytes, tên sheet) trên nhiều process
+    
+    Args:
+        jobs: List (file_name, file_bytes, sheet_name)
+        max_workers: Số process tối đa (default=số CPU)
+        known_image_refs: Xem load_and_process_data
+    
+    Yields:
+        (vị trí job, kết quả process_sheet_job hoặc None, exception hoặc None)
+        theo thứ tự job hoàn thành; 1 job lỗi không làm dừng các job khác
+    """
+    max_workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if max_workers <= 1:
+        for job_idx, job in enumerate(jobs):
+            try:
+                yield job_idx, process_sheet_job(*job, known_image_refs), None
+            except Exception as e:
+                yield job_idx, None, e
+        return
+    
+    # "spawn": process con không kế thừa các thread của server đang chạy
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+        futures = {pool.submit(process_sheet_job, *job, known_image_refs): job_idx for job_idx, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], (future.result() if error is None else None), error
+
+# === HÀM: Gộp kết quả nhiều sheet ===
+def merge_results(results):
+    """Gộp nhiều kết quả load_and_process_data (theo thứ tự) thành 1 bộ dữ liệu"""
+    if len(results) == 1:
+        return results[0]
+    
+    # Category khác bảng giá trị bị concat đổi về object -> thu gọn lại
+    df = compact_task_frame(pd.concat([result[0] for result in results], ignore_index=True))
+    images = {}
+    thumbnails = {}
+    for result in results:
+        images.update(result[1])
+        thumbnails.update(result[2])
+    search_index = TaskSearchIndex.merge([result[3] for result in results])
+    visible_count = sum(result[4] for result in results)
+    total_count = sum(result[5] for result in results)
+    return df, images, thumbnails, search_index, visible_count, total_count
+
+# === HÀM: Bổ sung thumbnail còn thiếu ===
+def complete_thumbnails(images, thumbnails, previous_thumbnails=None):
+    """
+    Trả về thumbnail cho mọi hình trong images: lấy từ thumbnails, rồi từ
+    previous_thumbnails (dữ liệu đã lưu), cuối cùng mới tạo mới
+    """
+    previous_thumbnails = previous_thumbnails if previous_thumbnails is not None else {}
+    completed = {}
+    for ref, img_bytes in images.items():
+        thumbnail = thumbnails.get(ref)
+        if thumbnail is None:
+            thumbnail = previous_thumbnails.get(ref)
+        if thumbnail is None:
+            thumbnail = make_thumbnail(img_bytes)
+        completed[ref] = thumbnail
+    return completed
+
+# === HÀM: So sánh 2 lần upload ===
+def diff_datasets(old_df, new_df, key_cols=TASK_KEY_COLS):
+    """
+    So sánh bảng task mới với bảng đã lưu theo khóa key_cols
+    
+    Task trùng khóa được ghép theo thứ tự xuất hiện. Chỉ so sánh các cột có ở cả 2 bảng.
+    
+    Returns:
+        DataFrame các dòng thay đổi với cột CHANGE ("Added" / "Removed" / "Changed"),
+        các cột khóa và CHANGED COLUMNS (tên các cột khác nhau, cách nhau bởi dấu phẩy)
+    """
+    def keyed(df):
+        keys = pd.DataFrame(index=pd.RangeIndex(len(df)))
+        for col in key_cols:
+            values = df[col].reset_index(drop=True) if col in df else pd.Series(None, index=keys.index, dtype=object)
+            keys[col] = decategorize(values).where(values.notna(), "").astype(str)
+        keys["_OCCURRENCE"] = keys.groupby(key_cols, sort=False).cumcount()
+        keys["_ROW"] = np.arange(len(df))
+        return keys
+    
+    pairs = keyed(old_df).merge(
+        keyed(new_df), on=key_cols + ["_OCCURRENCE"], how="outer", suffixes=("_OLD", "_NEW"), indicator=True
+    )
+    removed_rows = pairs.loc[pairs["_merge"] == "left_only", "_ROW_OLD"].to_numpy(dtype=np.int64)
+    added_rows = pairs.loc[pairs["_merge"] == "right_only", "_ROW_NEW"].to_numpy(dtype=np.int64)
+    both = pairs[pairs["_merge"] == "both"]
+    old_rows = both["_ROW_OLD"].to_numpy(dtype=np.int64)
+    new_rows = both["_ROW_NEW"].to_numpy(dtype=np.int64)
+    
+    # So sánh từng cột (vectorized) trên các cặp dòng cùng khóa
+    compare_cols = [
+        col for col in new_df.columns
+        if col in old_df.columns and col not in key_cols and col not in DIFF_IGNORE_COLS
+    ]
+    changed_cols = np.full(len(both), "", dtype=object)
+    for col in compare_cols:
+        # Category của 2 bảng có bảng giá trị khác nhau -> so sánh theo giá trị
+        old_values = decategorize(old_df[col].iloc[old_rows].reset_index(drop=True))
+        new_values = decategorize(new_df[col].iloc[new_rows].reset_index(drop=True))
+        try:
+            same = (old_values == new_values) | (old_values.isna() & new_values.isna())
+        except TypeError:
+            same = old_values.astype(str) == new_values.astype(str)
+        differs = ~same.to_numpy(dtype=bool)
+        changed_cols[differs] = changed_cols[differs] + col + ", "
+    is_changed = changed_cols != ""
+    
+    def change_rows(df, rows, change, columns):
+        changes = pd.DataFrame({"CHANGE": change}, index=pd.RangeIndex(len(rows)))
+        for col in key_cols:
+            changes[col] = df[col].iloc[rows].to_numpy() if col in df else None
+        changes["CHANGED COLUMNS"] = columns
+        return changes
+    
+    return pd.concat([
+        change_rows(new_df, added_rows, "Added", ""),
+        change_rows(old_df, removed_rows, "Removed", ""),
+        change_rows(new_df, new_rows[is_changed], "Changed", [cols[:-2] for cols in changed_cols[is_changed]]),
+    ], ignore_index=True)
+
+# === HÀM: Tính STATUS (vectorized) ===
+def compute_status(df, as_of=None):
+    """
+    Tính STATUS cho toàn bộ bảng theo ngày as_of
+    
+    Args:
+        df: DataFrame đã qua load_and_process_data
+        as_of: Ngày dùng để so sánh (default=hôm nay)
+    
+    Returns:
+        Series STATUS (category, bảng giá trị STATUS_LABELS) cùng index với df
+    """
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+    
+    def date_column(col):
+        if col not in df:
+            return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return df[col]
+        return pd.to_datetime(df[col], errors="coerce")
+    
+    # CONFIRM FROM BARON ít giá trị khác nhau -> chỉ kiểm tra "go" trên các giá trị duy nhất
+    confirm = df["CONFIRM FROM BARON"] if "CONFIRM FROM BARON" in df else pd.Series("", index=df.index)
+    if isinstance(confirm.dtype, pd.CategoricalDtype):
+        # Ô trống có mã -1 -> trỏ tới None ở cuối
+        codes = confirm.cat.codes.to_numpy()
+        uniques = list(confirm.cat.categories) + [None]
+    else:
+        codes, uniques = pd.factorize(confirm, use_na_sentinel=False)
+    unique_is_go = pd.Series(uniques, dtype=object).fillna("").astype(str).str.lower().str.contains("go", regex=False)
+    is_go = unique_is_go.to_numpy()[codes]
+    
+    start = date_column("START DATE")
+    due = date_column("DUE DATE")
+    
+    # So sánh theo ngày: start.date() > as_of  <=>  start >= as_of + 1 ngày; due.date() < as_of  <=>  due < as_of
+    # Thứ tự ưu tiên: Completed > New Task > Delay > Working (NaT luôn cho False)
+    status_codes = np.select(
+        [is_go, (start >= as_of + pd.Timedelta(days=1)).to_numpy(), (due < as_of).to_numpy()],
+        [STATUS_LABELS.index("Completed"), STATUS_LABELS.index("New Task"), STATUS_LABELS.index("Delay")],
+        default=STATUS_LABELS.index("Working"),
+    )
+    return pd.Series(
+        pd.Categorical.from_codes(status_codes, categories=STATUS_LABELS), index=df.index, name="STATUS"
+    )
+
+# === HÀM: Tạo cube thống kê ===
+def build_status_cube(df):
+    """
+    Đếm số task theo (tháng START DATE × STATUS × Requester); df phải có cột STATUS
+    
+    Returns:
+        DataFrame nhỏ với các cột month ("YYYY-MM" hoặc None), STATUS, Requester, count
+    """
+    start = df["START DATE"]
+    requester = df["Requester"] if "Requester" in df else pd.Series(None, index=df.index, dtype=object)
+    keys = pd.DataFrame({
+        "month": start.dt.year * 100 + start.dt.month,
+        "STATUS": df["STATUS"],
+        "Requester": requester,
+    })
+    cube = keys.groupby(["month", "STATUS", "Requester"], dropna=False).size().reset_index(name="count")
+    
+    # Đổi khóa tháng (yyyymm) sang chuỗi "YYYY-MM" trên từng nhóm, không phải từng dòng
+    cube["month"] = cube["month"].map(lambda key: f"{int(key) // 100:04d}-{int(key) % 100:02d}" if pd.notna(key) else None)
+    return cube
+
@@ -0,0 +1,163 @@
+import io
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.drawing.image import Image as XLImage
+from openpyxl.utils import get_column_letter
+from baroncore import decategorize, split_picture_refs
+from baronview import format_task_rows
+
+# =========================================================
+# TASK DASHBOARD - XUẤT FILE (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# === Xuất file ===
+# Số dòng mỗi lần định dạng / ghi: bộ nhớ không tăng theo số dòng xuất
+EXPORT_CHUNK_ROWS = 5000
+# {định dạng: (tên hiển thị, đuôi file, MIME)}
+EXPORT_FORMATS = {
+    "csv": ("CSV", "csv", "text/csv"),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("Excel (có hình)", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+# Kích thước hiển thị tối đa của hình trong file Excel (pixel); hình gốc vẫn được nhúng nguyên vẹn
+XLSX_IMAGE_MAX_SIZE = (160, 120)
+# Số hình nhúng tối đa mỗi file Excel: openpyxl giữ bytes của mọi hình đã thêm trong bộ nhớ đến lúc save,
+# nên bộ nhớ tăng theo số hình chứ không theo EXPORT_CHUNK_ROWS; các hình sau giới hạn không được nhúng
+XLSX_MAX_IMAGES = 500
+
+def iter_row_chunks(rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Chia mảng vị trí dòng thành từng phần chunk_rows dòng"""
+    for start in range(0, len(rows), chunk_rows):
+        yield rows[start:start + chunk_rows]
+
+# === HÀM: Xuất CSV ===
+def write_csv(df, rows, cols, file):
+    """Ghi các dòng rows (theo thứ tự) ra file nhị phân dạng CSV UTF-8 có BOM (Excel mở đúng tiếng Việt)"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        pd.DataFrame(columns=cols).to_csv(text, index=False)
+        for chunk_rows in iter_row_chunks(rows):
+            format_task_rows(df.iloc[chunk_rows], cols).to_csv(text, header=False, index=False)
+        text.flush()
+    finally:
+        text.detach()
+
+# === HÀM: Xuất Parquet ===
+def write_parquet(df, rows, cols, file):
+    """Ghi các dòng rows ra Parquet theo từng phần; cột ngày / số giữ nguyên kiểu, cột còn lại thành chuỗi"""
+    native_cols = {
+        col for col in cols
+        if isinstance(df[col].dtype, np.dtype) and df[col].dtype.kind in "biufM"
+    }
+    schema = pa.schema([
+        (col, pa.from_numpy_dtype(df[col].dtype) if col in native_cols else pa.string()) for col in cols
+    ])
+    with pq.ParquetWriter(file, schema) as writer:
+        for chunk_rows in iter_row_chunks(rows):
+            chunk = df[cols].iloc[chunk_rows]
+            for col in cols:
+                if col not in native_cols:
+                    values = decategorize(chunk[col])
+                    chunk[col] = values.where(values.isna(), values.astype(str))
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+# === HÀM: Hình để nhúng vào Excel ===
+def make_xlsx_image(img_bytes):
+    """Image của openpyxl từ bytes gốc, thu nhỏ khi hiển thị (None nếu Pillow không đọc được hình)"""
+    try:
+        image = XLImage(io.BytesIO(img_bytes))
+    except Exception:
+        return None
+    scale = min(1, XLSX_IMAGE_MAX_SIZE[0] / image.width, XLSX_IMAGE_MAX_SIZE[1] / image.height)
+    image.width = max(1, round(image.width * scale))
+    image.height = max(1, round(image.height * scale))
+    return image
+
+# === HÀM: Xuất Excel có hình ===
+def write_xlsx(df, rows, cols, file, images=None, filters=()):
+    """
+    Ghi các dòng rows ra Excel (workbook write-only: các dòng được ghi dần ra file tạm)
+    
+    Args:
+        images: Kho hình {khóa hình: bytes}; hình gốc được nhúng ở cột PICTURE cạnh task,
+            task nhiều hình thêm các cột PICTURE 2, PICTURE 3... (None = không xuất hình).
+            Nhúng tối đa XLSX_MAX_IMAGES hình, số hình bị bỏ qua ghi ở sheet "Bộ lọc"
+        filters: List (tên, giá trị) các bộ lọc đang áp dụng, ghi ở sheet "Bộ lọc"
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Tasks")
+    with_images = images is not None and "PICTURE_REF" in df
+    picture_count = 0
+    if with_images:
+        # Số cột hình = số hình nhiều nhất của 1 task (chỉ xét các giá trị khác nhau của PICTURE_REF)
+        unique_refs = pd.unique(decategorize(df["PICTURE_REF"].iloc[rows]))
+        picture_count = max(1, max((len(split_picture_refs(value)) for value in unique_refs), default=0))
+    header = list(cols) + [f"PICTURE {idx}" if idx > 1 else "PICTURE" for idx in range(1, picture_count + 1)]
+    picture_cols = [get_column_letter(len(cols) + idx) for idx in range(1, picture_count + 1)]
+    for picture_col in picture_cols:
+        # 1 đơn vị độ rộng cột ~ 7 pixel
+        ws.column_dimensions[picture_col].width = XLSX_IMAGE_MAX_SIZE[0] / 7
+    ws.append(header)
+    
+    embedded_images = 0
+    skipped_images = 0
+    excel_row = 2
+    for chunk_rows in iter_row_chunks(rows):
+        chunk = format_task_rows(df.iloc[chunk_rows], cols)
+        refs = decategorize(df["PICTURE_REF"].iloc[chunk_rows]).to_numpy() if with_images else [""] * len(chunk)
+        for values, task_refs in zip(chunk.itertuples(index=False), refs):
+            row_height = 0
+            for picture_col, ref in zip(picture_cols, split_picture_refs(task_refs)):
+                if embedded_images >= XLSX_MAX_IMAGES:
+                    skipped_images += 1
+                    continue
+                # Đọc hình từ kho mỗi lần cần (không giữ bản sao bytes ngoài bản openpyxl giữ đến lúc save)
+                img_bytes = images.get(ref)
+                image = make_xlsx_image(img_bytes) if img_bytes is not None else None
+                if image is not None:
+                    embedded_images += 1
+                    row_height = max(row_height, image.height)
+                    image.anchor = f"{picture_col}{excel_row}"
+                    ws.add_image(image)
+            if row_height:
+                # Chiều cao dòng tính bằng point (1 pixel = 0.75 point)
+                ws.row_dimensions[excel_row].height = row_height * 0.75
+            ws.append([ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value for value in values])
+            excel_row += 1
+    
+    if skipped_images:
+        filters = list(filters) + [(f"Hình không nhúng (quá {XLSX_MAX_IMAGES} hình)", skipped_images)]
+    if filters:
+        ws_filters = wb.create_sheet("Bộ lọc")
+        for name, value in filters:
+            ws_filters.append([name, value])
+    wb.save(file)
+
+# === HÀM: Xuất các dòng đang lọc ===
+def export_task_rows(export_format, df, rows, cols, images=None, filters=()):
+    """
+    Xuất các dòng rows theo định dạng export_format (khóa của EXPORT_FORMATS) ra file tạm
+    
+    Returns:
+        File tạm (nhị phân, đã về đầu file), tự xóa khi đóng
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        if export_format == "csv":
+            write_csv(df, rows, cols, file)
+        elif export_format == "parquet":
+            write_parquet(df, rows, cols, file)
+        elif export_format == "xlsx":
+            write_xlsx(df, rows, cols, file, images=images, filters=filters)
+        else:
+            raise ValueError(f"Định dạng xuất không hỗ trợ: {export_format}")
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return file
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    # Không có psutil: chỉ đo được RSS trên Linux (/proc)
+    psutil = None
+
+# =========================================================
+# TASK DASHBOARD - ĐO THỜI GIAN / BỘ NHỚ TỪNG BƯỚC (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# BARON_TRACE_MEMORY=1: đo bộ nhớ đỉnh từng bước bằng tracemalloc (chậm hơn, chỉ nên bật khi điều tra).
+# Mặc định đo RSS của process: 1 thread phụ đo RSS mỗi RSS_SAMPLE_SECONDS trong lúc có bước đang chạy,
+# đỉnh = RSS lớn nhất đo được trong bước (kể cả các bước con), kèm mức tăng RSS của bước.
+TRACE_MEMORY = os.environ.get("BARON_TRACE_MEMORY") == "1"
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Xoay vòng file log JSON khi vượt dung lượng này
+METRICS_LOG_MAX_BYTES = 10 * 1024 * 1024
+# Chu kỳ đo RSS khi có bước đang chạy (đỉnh ngắn hơn chu kỳ này có thể bị sót)
+RSS_SAMPLE_SECONDS = 0.005
+
+# === HÀM: RSS hiện tại của process ===
+def current_rss_bytes():
+    """RSS hiện tại của process (None nếu không đo được: không phải Linux và không có psutil)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+def current_memory_bytes():
+    """Bộ nhớ hiện tại theo cách đo đang dùng (tracemalloc hoặc RSS)"""
+    return tracemalloc.get_traced_memory()[0] if TRACE_MEMORY else current_rss_bytes()
+
+# === Thread đo RSS dùng chung cả process ===
+# Các recorder đang có bước mở; thread chỉ đo khi set này khác rỗng
+_sampling_recorders = set()
+_sampling_lock = threading.Lock()
+_sampling_active = threading.Event()
+_sampler_thread = None
+
+def _rss_sampler_loop():
+    """Mỗi RSS_SAMPLE_SECONDS đo RSS 1 lần và báo cho các recorder đang có bước mở"""
+    while True:
+        _sampling_active.wait()
+        time.sleep(RSS_SAMPLE_SECONDS)
+        rss = current_rss_bytes()
+        with _sampling_lock:
+            recorders = list(_sampling_recorders)
+        for recorder in recorders:
+            recorder._observe_rss(rss)
+
+def _start_sampling(recorder):
+    global _sampler_thread
+    with _sampling_lock:
+        _sampling_recorders.add(recorder)
+        _sampling_active.set()
+        if _sampler_thread is None:
+            _sampler_thread = threading.Thread(target=_rss_sampler_loop, name="baron-rss-sampler", daemon=True)
+            _sampler_thread.start()
+
+def _stop_sampling(recorder):
+    with _sampling_lock:
+        _sampling_recorders.discard(recorder)
+        if not _sampling_recorders:
+            _sampling_active.clear()
+
+# === Ghi nhận từng bước ===
+class StageRecorder:
+    """
+    Ghi thời gian, số dòng và bộ nhớ đỉnh của từng bước trong 1 lần chạy
+    (1 lần ingest, 1 lần rerun của web, 1 lần chạy baronbuild.py...)
+    
+    Các bước lồng nhau được: bộ nhớ đỉnh của bước cha tính cả các bước con.
+    Các session chạy song song dùng chung 1 process (RSS / bộ đếm tracemalloc) nên số liệu chỉ là gần đúng.
+    """
+    
+    def __init__(self, kind, label=""):
+        self.kind = kind
+        self.label = label
+        self.started = datetime.now()
+        self._started_perf = time.perf_counter()
+        self.records = []
+        # Đỉnh bộ nhớ lớn nhất đã thấy của từng bước đang mở (tracemalloc / RSS chỉ có 1 số chung)
+        self._open_peaks = []
+        # Thread đo RSS cập nhật _open_peaks song song với thread đang chạy các bước
+        self._peaks_lock = threading.Lock()
+    
+    def _observe_rss(self, rss):
+        """Gọi từ thread đo RSS: cập nhật đỉnh của bước đang mở trong cùng (bước cha nhận lại khi bước con đóng)"""
+        with self._peaks_lock:
+            if self._open_peaks:
+                self._open_peaks[-1] = _max_bytes(self._open_peaks[-1], rss)
+    
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Đo 1 bước; số dòng có thể gán sau qua dict được yield (record["rows"] = ...)"""
+        record = {"stage": name, "rows": rows}
+        if TRACE_MEMORY:
+            if self._open_peaks:
+                self._open_peaks[-1] = _max_bytes(self._open_peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        start_bytes = current_memory_bytes()
+        with self._peaks_lock:
+            self._open_peaks.append(start_bytes)
+            outermost = len(self._open_peaks) == 1
+        if outermost and not TRACE_MEMORY and start_bytes is not None:
+            _start_sampling(self)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - started
+            end_bytes = current_memory_bytes()
+            with self._peaks_lock:
+                peak = _max_bytes(self._open_peaks.pop(), end_bytes)
+                if TRACE_MEMORY:
+                    peak = _max_bytes(peak, tracemalloc.get_traced_memory()[1])
+                    tracemalloc.reset_peak()
+                outermost = not self._open_peaks
+                if not outermost:
+                    self._open_peaks[-1] = _max_bytes(self._open_peaks[-1], peak)
+            if outermost and not TRACE_MEMORY:
+                _stop_sampling(self)
+            record["peak_bytes"] = peak
+            record["delta_bytes"] = end_bytes - start_bytes if None not in (start_bytes, end_bytes) else None
+            self.records.append(record)
+    
+    def finish(self, name="total"):
+        """Thêm 1 bước tổng cho cả lần chạy (từ lúc tạo recorder đến giờ)"""
+        peak = current_memory_bytes()
+        if TRACE_MEMORY:
+            peak = _max_bytes(peak, tracemalloc.get_traced_memory()[1])
+        for record in self.records:
+            peak = _max_bytes(peak, record["peak_bytes"])
+        self.records.append({
+            "stage": name, "rows": None, "seconds": time.perf_counter() - self._started_perf,
+            "peak_bytes": peak, "delta_bytes": None,
+        })
+    
+    def extend(self, records, **fields):
+        """Thêm các bước đã đo ở nơi khác (vd. trong process con), kèm các trường fields (vd. job=...)"""
+        for record in records:
+            self.records.append(dict(record, **fields))
+    
+    def to_dict(self):
+        return {
+            "time": self.started.isoformat(timespec="seconds"),
+            "kind": self.kind,
+            "label": self.label,
+            "memory": "tracemalloc" if TRACE_MEMORY else "rss",
+            "stages": self.records,
+        }
+
+def _max_bytes(a, b):
+    """max bỏ qua None (không đo được)"""
+    return b if a is None else a if b is None else max(a, b)
+
+# === Số liệu cộng dồn của cả process ===
+class MetricsRegistry:
+    """Tổng hợp {(kind, stage): số lần, tổng / lớn nhất / lần cuối thời gian...} cho file Prometheus"""
+    
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, recorder):
+        with self._lock:
+            for record in recorder.records:
+                stats = self.stages.setdefault((recorder.kind, record["stage"]), {
+                    "count": 0, "seconds_sum": 0.0, "seconds_max": 0.0,
+                    "last_seconds": 0.0, "last_rows": None, "last_peak_bytes": None, "last_delta_bytes": None,
+                })
+                stats["count"] += 1
+                stats["seconds_sum"] += record["seconds"]
+                stats["seconds_max"] = max(stats["seconds_max"], record["seconds"])
+                stats["last_seconds"] = record["seconds"]
+                stats["last_rows"] = record["rows"]
+                stats["last_peak_bytes"] = record["peak_bytes"]
+                stats["last_delta_bytes"] = record.get("delta_bytes")
+    
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self.stages.items()}
+    
+    def to_prometheus(self):
+        """Nội dung file theo định dạng text của Prometheus (node_exporter textfile collector)"""
+        metrics = [
+            ("baron_stage_runs_total", "counter", "Number of times the stage ran", "count"),
+            ("baron_stage_seconds_total", "counter", "Total time spent in the stage", "seconds_sum"),
+            ("baron_stage_seconds_max", "gauge", "Slowest run of the stage", "seconds_max"),
+            ("baron_stage_last_seconds", "gauge", "Duration of the last run of the stage", "last_seconds"),
+            ("baron_stage_last_rows", "gauge", "Rows handled by the last run of the stage", "last_rows"),
+            ("baron_stage_last_peak_bytes", "gauge",
+             "Peak memory of the last run of the stage (highest process RSS sampled during the stage, "
+             "or tracemalloc peak with BARON_TRACE_MEMORY=1)", "last_peak_bytes"),
+            ("baron_stage_last_delta_bytes", "gauge",
+             "Memory growth over the last run of the stage (end minus start)", "last_delta_bytes"),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for metric, metric_type, help_text, field in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for (kind, stage), stats in sorted(snapshot.items()):
+                if stats[field] is not None:
+                    lines.append(f'{metric}{{kind="{kind}",stage="{stage}"}} {stats[field]}')
+        return "\n".join(lines) + "\n"
+
+# Dùng chung cho mọi session trong cùng process
+REGISTRY = MetricsRegistry()
+_write_lock = threading.Lock()
+
+# === HÀM: Ghi số liệu ra file ===
+def write_metrics(recorder, prom_path, log_path, registry=REGISTRY):
+    """
+    Cộng số liệu của recorder vào registry, ghi thêm 1 dòng JSON vào log_path
+    (xoay vòng khi quá METRICS_LOG_MAX_BYTES) và ghi lại toàn bộ prom_path
+    """
+    registry.observe(recorder)
+    prom_path, log_path = Path(prom_path), Path(log_path)
+    with _write_lock:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        if log_path.exists() and log_path.stat().st_size > METRICS_LOG_MAX_BYTES:
+            os.replace(log_path, log_path.with_name(log_path.name + ".1"))
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(recorder.to_dict(), ensure_ascii=False) + "\n")
+        
+        # Ghi file tạm rồi đổi tên: collector không bao giờ đọc phải file ghi dở
+        tmp_path = prom_path.with_name(f"{prom_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(registry.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, prom_path)
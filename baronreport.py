@@ -1,13 +1,27 @@
 import streamlit as st
 import pandas as pd
-import openpyxl
-import base64
+import numpy as np
+import io
 from datetime import datetime
-import plotly.graph_objects as go
-import plotly.express as px
-import pickle
 import os
-from pathlib import Path
+import threading
+from functools import partial
+from collections import OrderedDict
+from baroncore import (
+    hash_file_bytes, detect_image_format, normalize_search_text, compute_status,
+    list_sheet_names, build_status_cube, split_picture_refs,
+)
+from baronview import (
+    DISPLAY_COLS, SOURCE_COLS, slice_status_cube, filter_task_rows, sort_task_rows,
+    render_task_table_html, create_status_badge, build_status_pie, build_monthly_chart,
+)
+from baronmetrics import StageRecorder, REGISTRY, write_metrics
+from baronexport import EXPORT_FORMATS, XLSX_MAX_IMAGES, export_task_rows
+from baronwatch import FolderWatcher
+from baronstore import (
+    CHANGES_FILE, METRICS_WEB_FILE, METRICS_LOG_FILE, DEFAULT_DATASET, DATASET_NAME_RE, DatasetCatalog,
+    BackgroundWriter, dataset_dir, read_change_log, load_and_process_jobs, hash_jobs, prepare_dataset, persist_dataset,
+)
 
 # =========================================================
 # TASK DASHBOARD - AUTO SAVE/LOAD VERSION
@@ -61,6 +75,10 @@ st.markdown("""
         font-weight: bold;
         color: #004085;
     }
+    div[data-testid="stImage"] img {
+        border-radius: 8px;
+        border: 1px solid #ddd;
+    }
     .auto-load-indicator {
         background-color: #d1f2eb;
         border-left: 4px solid #1abc9c;
@@ -72,295 +90,745 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# === Đường dẫn lưu dữ liệu ===
-DATA_DIR = Path("saved_data")
-DATA_DIR.mkdir(exist_ok=True)
-SAVED_DATA_FILE = DATA_DIR / "dashboard_data.pkl"
-
-# === HÀM: Lưu dữ liệu (Auto) ===
-def save_dashboard_data(df, images, upload_time, uploaded_filename):
-    """Tự động lưu dữ liệu dashboard vào file"""
-    data = {
-        "df": df,
-        "images": images,
-        "upload_time": upload_time,
-        "uploaded_filename": uploaded_filename
-    }
-    try:
-        with open(SAVED_DATA_FILE, 'wb') as f:
-            pickle.dump(data, f)
-        return True
-    except Exception as e:
-        st.error(f"❌ Lỗi khi lưu dữ liệu: {str(e)}")
-        return False
-
-# === HÀM: Load dữ liệu đã lưu (Auto) ===
-def load_saved_data():
-    """Tự động load dữ liệu đã lưu từ file"""
-    if SAVED_DATA_FILE.exists():
-        try:
-            with open(SAVED_DATA_FILE, 'rb') as f:
-                data = pickle.load(f)
-            return data
-        except Exception as e:
-            st.error(f"❌ Lỗi khi load dữ liệu: {str(e)}")
-            return None
-    return None
-
-# === HÀM: Xóa dữ liệu đã lưu (Auto) ===
-def clear_saved_data():
-    """Tự động xóa dữ liệu đã lưu khi upload file mới"""
-    if SAVED_DATA_FILE.exists():
-        try:
-            os.remove(SAVED_DATA_FILE)
-            return True
-        except Exception as e:
-            st.error(f"❌ Lỗi khi xóa dữ liệu: {str(e)}")
-            return False
-    return False
+# === Thư viện hình ảnh ===
+GALLERY_PAGE_SIZES = [12, 24, 48]
+
+# === Cache view đã lọc ===
+FILTER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# === Bảng dữ liệu ===
+TABLE_PAGE_SIZES = [25, 50, 100, 200]
 
-# === HÀM: Lấy các dòng visible từ Excel ===
-def get_visible_rows(ws, header_row=3):
+# Các định dạng trình duyệt hiển thị được
+BROWSER_IMAGE_FORMATS = {"PNG", "JPEG", "GIF", "BMP", "WEBP"}
+
+# === Tự xử lý file trong thư mục (vd. thư mục đồng bộ chứa tracker), trống = tắt ===
+WATCH_DIR = os.environ.get("BARON_WATCH_DIR")
+# Bộ dữ liệu nhận dữ liệu của thư mục theo dõi
+WATCH_DATASET = os.environ.get("BARON_WATCH_DATASET", DEFAULT_DATASET)
+
+# === Bộ dữ liệu ===
+# Lựa chọn cuối của ô chọn bộ dữ liệu: nhập tên bộ mới
+NEW_DATASET_OPTION = "➕ Tạo bộ dữ liệu mới..."
+
+# === Cache các view đã lọc ===
+class FilterCache:
+    """
+    LRU cache {khóa: mảng vị trí dòng (iloc)}, giới hạn theo tổng dung lượng các mảng.
+    Dùng chung cho mọi session nên mọi thao tác trên cache đều giữ lock;
+    mảng trả về là read-only để không session nào sửa được dữ liệu dùng chung.
     """
-    Lấy danh sách các dòng KHÔNG BỊ ẨN trong Excel
     
-    Args:
-        ws: Worksheet từ openpyxl
-        header_row: Dòng header (default=3)
+    def __init__(self, max_bytes=FILTER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
     
-    Returns:
-        List các số dòng visible (bắt đầu từ header_row + 1)
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is not None:
+                self._entries.move_to_end(key)
+                return rows
+        
+        # Tính ngoài lock để session khác không phải chờ
+        rows = np.asarray(compute(), dtype=np.int64)
+        rows.setflags(write=False)
+        
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = rows
+                self._bytes += rows.nbytes
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return rows
+
+@st.cache_resource
+def get_filter_cache():
+    """FilterCache duy nhất cho cả server"""
+    return FilterCache()
+
+@st.cache_resource
+def get_dataset_catalog():
+    """DatasetCatalog duy nhất cho cả server: mỗi phiên bản của mỗi bộ dữ liệu chỉ load 1 lần"""
+    return DatasetCatalog()
+
+@st.cache_resource
+def get_background_writer():
+    """BackgroundWriter duy nhất cho cả server: các lần lưu được ghi lần lượt"""
+    return BackgroundWriter()
+
+# === HÀM: Lưu bộ dữ liệu vừa upload (chạy ở thread nền) ===
+def persist_upload(registry, dataset, changes, recorder):
+    """Ghi dataset ra đĩa, rồi thay bản vừa upload bằng bản load lại từ đĩa (hình / thumbnail memory-map)"""
+    try:
+        persist_dataset(dataset, changes, recorder=recorder)
+        registry.refresh()
+    finally:
+        write_metrics(recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+
+# === HÀM: Xử lý file mới trong thư mục theo dõi (chạy ở thread của FolderWatcher) ===
+def ingest_watched_jobs(catalog, writer, name, jobs, file_hash):
+    """
+    Xử lý các job của FolderWatcher rồi publish vào bộ dữ liệu name, trừ khi dữ liệu hiện tại đã là các file này.
+    Việc ghi ra đĩa xếp hàng trong writer cùng các lần upload, để các phiên bản được ghi đúng thứ tự
     """
-    visible_rows = []
+    registry = catalog.registry(name)
+    registry.refresh()
+    current = registry.current()
+    if current is not None and current.file_hash == file_hash:
+        return
     
-    for row_idx in range(header_row + 1, ws.max_row + 1):
-        row_dimension = ws.row_dimensions[row_idx]
-        
-        if not row_dimension.hidden:
-            visible_rows.append(row_idx)
+    uploaded_filename = ", ".join(dict.fromkeys(file_name for file_name, _, _ in jobs))
+    recorder = StageRecorder("watch", label=uploaded_filename)
+    previous = {"df": current.df, "thumbnails": current.thumbnails} if current is not None else None
+    result, errors = load_and_process_jobs(
+        jobs,
+        known_image_refs=frozenset(previous["thumbnails"].keys()) if previous is not None else frozenset(),
+        recorder=recorder
+    )
+    if errors:
+        # Không publish bộ dữ liệu thiếu file: thử lại khi file thay đổi
+        write_metrics(recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+        raise RuntimeError("; ".join(f"{label}: {message}" for label, message in errors))
     
-    return visible_rows
+    new_dataset, changes = prepare_dataset(
+        result, previous, datetime.now(), uploaded_filename, file_hash, recorder=recorder, name=name
+    )
+    registry.publish(new_dataset)
+    writer.submit(uploaded_filename, partial(persist_upload, registry, new_dataset, changes, recorder))
 
-# === HÀM: Load và xử lý dữ liệu ===
-def load_and_process_data(uploaded_file):
-    """Load và xử lý CHỈ dữ liệu VISIBLE từ Excel file"""
-    today = pd.Timestamp.now().normalize()
-    
-    # Đọc Excel với openpyxl
-    wb = openpyxl.load_workbook(uploaded_file, data_only=True)
-    ws = wb.active
+@st.cache_resource
+def get_folder_watcher(watch_dir, dataset_name):
+    """FolderWatcher duy nhất cho mỗi thư mục, publish vào bộ dữ liệu dataset_name của server"""
+    watcher = FolderWatcher(
+        watch_dir, partial(ingest_watched_jobs, get_dataset_catalog(), get_background_writer(), dataset_name)
+    )
+    watcher.start()
+    return watcher
+
+# === HÀM: Đọc nhật ký thay đổi ===
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_change_log(dataset_name, log_mtime):
+    """read_change_log, cache theo bộ dữ liệu và thời điểm sửa file (log_mtime chỉ dùng làm khóa cache)"""
+    return read_change_log(dataset_name)
+
+# === HÀM: Danh sách sheet của file upload (cache theo hash) ===
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_sheet_names(file_hash, _file_bytes):
+    return list_sheet_names(io.BytesIO(_file_bytes))
+
+# === HÀM: Hiển thị hình gốc ===
+@st.dialog("🖼️ Hình ảnh gốc", width="large")
+def show_full_image(task_name, images, refs):
+    """Mở các hình gốc của task trong dialog, chỉ đọc bytes khi người dùng bấm xem"""
+    st.markdown(f"**{task_name}**")
+    for img_idx, ref in enumerate(refs, start=1):
+        img_bytes = images.get(ref)
+        if img_bytes is None:
+            continue
+        image_format, mime = detect_image_format(img_bytes)
+        if image_format in BROWSER_IMAGE_FORMATS:
+            st.image(bytes(img_bytes), width="stretch")
+        else:
+            st.warning(f"⚠️ Trình duyệt không hiển thị được hình định dạng {image_format}")
+        # Task nhiều hình: đánh số hình trong nút / tên file
+        number = f" {img_idx}/{len(refs)}" if len(refs) > 1 else ""
+        suffix = f"_{img_idx}" if len(refs) > 1 else ""
+        st.download_button(
+            label=f"📥 Tải hình gốc{number}",
+            data=bytes(img_bytes),
+            file_name=f"{task_name}{suffix}.{image_format.lower()}",
+            mime=mime,
+            key=f"download_full_image_{img_idx}",
+        )
+
+# === HÀM: Tạo cube thống kê ===
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_status_cube(dataset_version, as_of, task_search, _df, _rows=None):
+    """
+    Đếm số task theo (tháng START DATE × STATUS × Requester)
     
-    # Lấy danh sách các dòng visible
-    visible_row_numbers = get_visible_rows(ws, header_row=3)
+    Cache theo (phiên bản dữ liệu, ngày as_of, từ khóa tìm kiếm): _df/_rows không được hash,
+    nên phải là dữ liệu tương ứng với bộ khóa đó. _rows: vị trí các dòng khớp tìm kiếm (None = tất cả)
     
-    # Lưu hình ảnh (chỉ từ các dòng visible)
-    images = {}
-    for image in ws._images:
-        cell = image.anchor._from
-        row_num = cell.row + 1
-        
-        if row_num in visible_row_numbers:
-            cell_coord = f"{openpyxl.utils.get_column_letter(cell.col + 1)}{row_num}"
-            img_bytes = image.ref.getvalue() if hasattr(image.ref, 'getvalue') else image.ref
-            images[cell_coord] = base64.b64encode(img_bytes).decode('utf-8')
-    
-    # Đọc toàn bộ Excel với pandas
-    df_full = pd.read_excel(uploaded_file, header=2, engine='openpyxl')
-    df_full.columns = df_full.columns.str.strip()
-    
-    # Lọc CHỈ GIỮ các dòng visible
-    visible_indices = [row_num - 4 for row_num in visible_row_numbers]
-    df = df_full.iloc[visible_indices].copy()
-    df.reset_index(drop=True, inplace=True)
-    
-    # Xử lý Status
-    def get_status(row):
-        confirm = str(row.get("CONFIRM FROM BARON", "")).strip().lower()
-        start_date = row.get("START DATE")
-        due = row.get("DUE DATE")
-        
-        if "go" in confirm:
-            return "Completed"
+    Returns:
+        DataFrame nhỏ với các cột month ("YYYY-MM" hoặc None), STATUS, Requester, count
+    """
+    if _rows is not None:
+        _df = _df.iloc[_rows]
+    return build_status_cube(_df)
+
+# === HÀM: Bảng số liệu các bước ===
+def stage_records_frame(records):
+    """DataFrame để hiển thị list số liệu của StageRecorder (ms, MB)"""
+    return pd.DataFrame({
+        "Bước": [record["stage"] for record in records],
+        "Job": [record.get("job", "") for record in records],
+        "ms": [round(record["seconds"] * 1000, 1) for record in records],
+        "Số dòng": [record["rows"] for record in records],
+        "Bộ nhớ đỉnh (MB)": [
+            round(record["peak_bytes"] / 1024 / 1024, 1) if record["peak_bytes"] is not None else None
+            for record in records
+        ],
+        "Tăng (MB)": [
+            round(record["delta_bytes"] / 1024 / 1024, 1) if record.get("delta_bytes") is not None else None
+            for record in records
+        ],
+    })
+
+# === HÀM: Bảng điều khiển hiệu năng (admin) ===
+def render_metrics_panel(rerun_recorder):
+    """Thời gian / bộ nhớ của lần rerun này, lần ingest gần nhất và số liệu cộng dồn của server"""
+    with st.expander("🛠️ Hiệu năng (admin)"):
+        st.caption(f"Lần chạy này ({rerun_recorder.to_dict()['memory']})")
+        st.dataframe(stage_records_frame(rerun_recorder.records), hide_index=True)
         
-        if pd.notna(start_date):
-            try:
-                if pd.to_datetime(start_date).date() > today.date():
-                    return "New Task"
-            except:
-                pass
+        if st.session_state.last_ingest_metrics:
+            st.caption(f"Lần xử lý file gần nhất: {st.session_state.last_ingest_metrics['label']}")
+            st.dataframe(stage_records_frame(st.session_state.last_ingest_metrics["stages"]), hide_index=True)
         
-        if pd.notna(due):
-            try:
-                if pd.to_datetime(due).date() < today.date():
-                    return "Delay"
-                else:
-                    return "Working"
-            except:
-                return "Working"
+        catalog = get_dataset_catalog()
+        st.caption(
+            f"Bộ dữ liệu trong bộ nhớ, ít dùng nhất trước (số session đang xem, "
+            f"giới hạn {catalog.memory_budget / 1024 / 1024:.0f} MB)"
+        )
+        st.dataframe(pd.DataFrame([
+            {"Bộ dữ liệu": name, "Bộ nhớ (MB)": round(memory / 1024 / 1024, 1), "Phiên bản": version, "Session": leases}
+            for name, (memory, versions) in catalog.stats().items()
+            for version, leases in versions.items()
+        ]), hide_index=True)
         
-        return "Working"
-    
-    df["STATUS"] = df.apply(get_status, axis=1)
+        snapshot = REGISTRY.snapshot()
+        st.caption("Cộng dồn từ lúc khởi động server")
+        st.dataframe(pd.DataFrame([
+            {
+                "Loại": kind,
+                "Bước": stage,
+                "Số lần": stats["count"],
+                "TB (ms)": round(stats["seconds_sum"] / stats["count"] * 1000, 1),
+                "Max (ms)": round(stats["seconds_max"] * 1000, 1),
+            }
+            for (kind, stage), stats in sorted(snapshot.items())
+        ]), hide_index=True)
+        st.caption(f"📄 {METRICS_WEB_FILE} | {METRICS_LOG_FILE}")
+
+# === HÀM: Tab biểu đồ ===
+def render_charts_tab(status_totals, cube_view, total_tasks):
+    """Biểu đồ tròn STATUS + biểu đồ cột theo tháng, vẽ từ cube thống kê đã lọc"""
+    col1, col2 = st.columns(2)
     
-    # Định dạng ngày
-    df["START DATE"] = pd.to_datetime(df["START DATE"], errors="coerce")
-    df["DUE DATE"] = pd.to_datetime(df["DUE DATE"], errors="coerce")
+    with col1:
+        st.subheader("Tỷ lệ STATUS các Task")
+        st.caption(f"Hiển thị {total_tasks} tasks")
+        status_counts = status_totals[status_totals > 0]
+        if not status_counts.empty:
+            st.plotly_chart(build_status_pie(status_counts), width="stretch")
+        else:
+            st.info("Không có dữ liệu để hiển thị")
     
-    # Thêm cột PICTURE_BASE64
-    df["PICTURE_BASE64"] = ""
-    header_row = [cell.value for cell in ws[3]]
-    try:
-        picture_col_idx = header_row.index("PICTURE")
+    with col2:
+        st.subheader("Phân bố theo tháng")
+        st.caption(f"Hiển thị {total_tasks} tasks")
+        fig_bar = build_monthly_chart(cube_view)
+        if fig_bar is not None:
+            st.plotly_chart(fig_bar, width="stretch")
+        else:
+            st.info("Không có dữ liệu ngày tháng để hiển thị")
+
+# === HÀM: Tab bảng dữ liệu ===
+@st.fragment
+def render_table_tab(dataset, df, filtered_rows, filter_key, filter_summary):
+    """
+    Bảng task đã lọc + xuất file. Là fragment: đổi sắp xếp / trang / định dạng xuất
+    chỉ chạy lại tab này (đo riêng với kind="fragment")
+    """
+    filter_cache = get_filter_cache()
+    images = dataset.images
+    recorder = StageRecorder("fragment", label="tab_table")
+    with recorder.stage("tab_table", rows=len(filtered_rows)):
+        st.subheader(f"Danh sách Task ({len(filtered_rows)} tasks)")
         
-        for idx, row in df.iterrows():
-            original_row_num = visible_row_numbers[idx]
-            cell_coord = f"{openpyxl.utils.get_column_letter(picture_col_idx + 1)}{original_row_num}"
-            if cell_coord in images:
-                df.at[idx, "PICTURE_BASE64"] = images[cell_coord]
-    except:
-        pass
-    
-    return df, images, ws, len(visible_row_numbers), ws.max_row - 3
-
-def create_status_badge(status):
-    """Tạo badge HTML cho status"""
-    if status == "Completed":
-        return '<span class="status-completed">✓ Completed</span>'
-    elif status == "Working":
-        return '<span class="status-working">⚙️ Working</span>'
-    elif status == "Delay":
-        return '<span class="status-delay">⚠️ Delay</span>'
-    elif status == "New Task":
-        return '<span class="status-newtask">🆕 New Task</span>'
-    return status
+        if len(filtered_rows) == 0:
+            st.warning("⚠️ Không có task nào khớp với bộ lọc hiện tại")
+        else:
+            table_cols = DISPLAY_COLS
+            if all(col in df for col in SOURCE_COLS) and len(df[SOURCE_COLS].drop_duplicates()) > 1:
+                table_cols = DISPLAY_COLS + SOURCE_COLS
+            
+            # Sắp xếp phía server + phân trang: chỉ format/render các dòng của trang đang xem
+            col_sort, col_order, col_size, col_page = st.columns(4)
+            with col_sort:
+                sort_col = st.selectbox("Sắp xếp theo", table_cols, key="table_sort_col")
+            with col_order:
+                sort_order = st.selectbox("Thứ tự", ["Tăng dần", "Giảm dần"], key="table_sort_order")
+            with col_size:
+                page_size = st.selectbox("Số dòng mỗi trang", TABLE_PAGE_SIZES, key="table_page_size")
+            total_pages = (len(filtered_rows) + page_size - 1) // page_size
+            if st.session_state.get("table_page", 1) > total_pages:
+                st.session_state.table_page = total_pages
+            with col_page:
+                page = st.number_input("Trang", min_value=1, max_value=total_pages, key="table_page")
+            
+            sorted_rows = filter_cache.get_or_compute(
+                filter_key + ("sort", sort_col, sort_order),
+                lambda: sort_task_rows(df, filtered_rows, sort_col, ascending=(sort_order == "Tăng dần"))
+            )
+            page_rows = sorted_rows[(page - 1) * page_size:page * page_size]
+            st.caption(
+                f"Trang {page}/{total_pages} - dòng {(page - 1) * page_size + 1}"
+                f"-{(page - 1) * page_size + len(page_rows)} / {len(filtered_rows)}"
+            )
+            st.markdown(render_task_table_html(df.iloc[page_rows], table_cols), unsafe_allow_html=True)
+            
+            # Xuất file: chỉ tạo khi bấm tải (theo bộ lọc + thứ tự đang xem), ghi từng phần ra file tạm
+            st.markdown("---")
+            export_format = st.selectbox(
+                "Định dạng xuất",
+                list(EXPORT_FORMATS),
+                format_func=lambda key: EXPORT_FORMATS[key][0],
+                key="export_format"
+            )
+            export_label, export_extension, export_mime = EXPORT_FORMATS[export_format]
+            export_filters = filter_summary + [
+                ("Sắp xếp", f"{sort_col} ({sort_order})"),
+                ("Số task", len(sorted_rows)),
+            ]
+            st.download_button(
+                label=f"📥 Download {export_label}",
+                data=partial(export_task_rows, export_format, df, sorted_rows, table_cols, images, export_filters),
+                file_name=f"task_dashboard_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_extension}",
+                mime=export_mime,
+                help=f"Nhúng tối đa {XLSX_MAX_IMAGES} hình" if export_format == "xlsx" else None,
+            )
+    write_metrics(recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+
+# === HÀM: Tab hình ảnh ===
+@st.fragment
+def render_gallery_tab(dataset, df, filtered_rows, filter_key):
+    """Thư viện thumbnail phân trang. Là fragment: đổi trang / xem hình gốc chỉ chạy lại tab này"""
+    filter_cache = get_filter_cache()
+    images = dataset.images
+    thumbnails = dataset.thumbnails
+    recorder = StageRecorder("fragment", label="tab_gallery")
+    with recorder.stage("tab_gallery"):
+        st.subheader("Thư viện hình ảnh Task")
+        
+        image_rows = filter_cache.get_or_compute(
+            filter_key + ("images",),
+            lambda: filtered_rows[(df["PICTURE_REF"].iloc[filtered_rows] != "").to_numpy()]
+        )
+        
+        if len(image_rows) > 0:
+            st.info(f"📸 Tìm thấy {len(image_rows)} task có hình ảnh")
+            
+            # Phân trang: chỉ gửi thumbnail của trang đang xem
+            col_size, col_page = st.columns(2)
+            with col_size:
+                page_size = st.selectbox("Số hình mỗi trang", GALLERY_PAGE_SIZES, key="gallery_page_size")
+            total_pages = (len(image_rows) + page_size - 1) // page_size
+            # Bộ lọc/số hình mỗi trang thay đổi có thể làm trang hiện tại vượt quá số trang
+            if st.session_state.get("gallery_page", 1) > total_pages:
+                st.session_state.gallery_page = total_pages
+            with col_page:
+                page = st.number_input("Trang", min_value=1, max_value=total_pages, key="gallery_page")
+            st.caption(f"Trang {page}/{total_pages}")
+            df_page = df.iloc[image_rows[(page - 1) * page_size:page * page_size]]
+            
+            cols_per_row = 3
+            rows = (len(df_page) + cols_per_row - 1) // cols_per_row
+            
+            for row_idx in range(rows):
+                cols = st.columns(cols_per_row)
+                for col_idx in range(cols_per_row):
+                    img_idx = row_idx * cols_per_row + col_idx
+                    if img_idx < len(df_page):
+                        task_row = df_page.iloc[img_idx]
+                        refs = split_picture_refs(task_row["PICTURE_REF"])
+                        with cols[col_idx]:
+                            st.markdown(f"**{task_row['TASK']}**")
+                            st.markdown(f"*Status: {create_status_badge(task_row['STATUS'])}*", unsafe_allow_html=True)
+                            
+                            # Thumbnail hình đầu tiên được trình duyệt tải qua URL, hình gốc chỉ đọc khi bấm xem
+                            thumb_bytes = thumbnails.get(refs[0])
+                            if thumb_bytes:
+                                image_format, _ = detect_image_format(thumb_bytes)
+                                if image_format in BROWSER_IMAGE_FORMATS:
+                                    st.image(bytes(thumb_bytes), width="stretch")
+                                else:
+                                    st.caption(f"🖼️ Hình định dạng {image_format}")
+                                if len(refs) > 1:
+                                    st.caption(f"🖼️ {len(refs)} hình")
+                                if st.button("🔍 Xem hình gốc", key=f"full_image_{df_page.index[img_idx]}"):
+                                    show_full_image(str(task_row["TASK"]), images, refs)
+                            
+                            st.markdown("---")
+        else:
+            st.warning("⚠️ Không có task nào có hình ảnh")
+    write_metrics(recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+
+# === HÀM: Tab thay đổi so với lần upload trước ===
+@st.fragment
+def render_changes_tab(dataset_name):
+    """Nhật ký thay đổi giữa các lần upload của bộ dữ liệu. Là fragment: chọn lần upload chỉ chạy lại tab này"""
+    recorder = StageRecorder("fragment", label="tab_changes")
+    with recorder.stage("tab_changes"):
+        st.subheader("Thay đổi giữa các lần upload")
+        
+        changes_file = dataset_dir(dataset_name) / CHANGES_FILE
+        change_log = load_change_log(dataset_name, changes_file.stat().st_mtime if changes_file.exists() else None)
+        if change_log:
+            entry_idx = st.selectbox(
+                "Lần upload",
+                range(len(change_log)),
+                format_func=lambda idx: f"{change_log[idx]['upload_time'][:19].replace('T', ' ')} - {change_log[idx]['uploaded_filename']}",
+                key="change_log_entry"
+            )
+            entry = change_log[entry_idx]
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("➕ Thêm mới", entry["added"])
+            with col2:
+                st.metric("➖ Đã xóa", entry["removed"])
+            with col3:
+                st.metric("✏️ Thay đổi", entry["changed"])
+            
+            if entry["rows"]:
+                df_changes = pd.DataFrame(entry["rows"])
+                df_changes["CHANGED COLUMNS"] = df_changes["CHANGED COLUMNS"].str.replace("PICTURE_REF", "PICTURE", regex=False)
+                st.dataframe(df_changes, hide_index=True)
+                total_rows = entry["added"] + entry["removed"] + entry["changed"]
+                if total_rows > len(df_changes):
+                    st.caption(f"Chỉ hiển thị {len(df_changes)} / {total_rows} dòng thay đổi")
+            else:
+                st.info("Không có task nào thay đổi")
+        else:
+            st.info("Chưa có lịch sử upload")
+    write_metrics(recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
 
 # === Tiêu đề chính ===
 st.title("📋 Task Dashboard")
 st.markdown("---")
 
 # === Khởi tạo session state ===
-if 'data_loaded' not in st.session_state:
-    st.session_state.data_loaded = False
-if 'df' not in st.session_state:
-    st.session_state.df = None
-if 'images' not in st.session_state:
-    st.session_state.images = None
-if 'upload_time' not in st.session_state:
-    st.session_state.upload_time = None
-if 'uploaded_filename' not in st.session_state:
-    st.session_state.uploaded_filename = None
-if 'auto_loaded' not in st.session_state:
-    st.session_state.auto_loaded = False
-
-# === AUTO-LOAD dữ liệu khi mở web lần đầu ===
-if not st.session_state.auto_loaded:
-    saved_data = load_saved_data()
-    if saved_data:
-        st.session_state.df = saved_data["df"]
-        st.session_state.images = saved_data["images"]
-        st.session_state.upload_time = saved_data["upload_time"]
-        st.session_state.uploaded_filename = saved_data["uploaded_filename"]
-        st.session_state.data_loaded = True
-    st.session_state.auto_loaded = True
+# Session chỉ giữ lease (con trỏ phiên bản), dữ liệu nằm trong DatasetCatalog dùng chung
+if 'dataset_lease' not in st.session_state:
+    st.session_state.dataset_lease = None
+if 'pending_dataset_name' not in st.session_state:
+    st.session_state.pending_dataset_name = None
+if 'upload_hash' not in st.session_state:
+    st.session_state.upload_hash = None
+if 'upload_file_hashes' not in st.session_state:
+    # {file_id của file trong ô upload: hash_file_bytes}: không hash lại file ở mỗi lần rerun
+    st.session_state.upload_file_hashes = {}
+if 'ingest_errors' not in st.session_state:
+    st.session_state.ingest_errors = []
+if 'last_ingest_metrics' not in st.session_state:
+    st.session_state.last_ingest_metrics = None
 
-# === Sidebar - Upload file ===
+# Thời gian / bộ nhớ từng bước của lần rerun này (ghi ra file ở cuối script)
+rerun_recorder = StageRecorder("rerun")
+
+# === Sidebar - Chọn bộ dữ liệu ===
+dataset_catalog = get_dataset_catalog()
 with st.sidebar:
     st.header("⚙️ Cấu hình")
     
+    dataset_options = sorted(set(dataset_catalog.names()) | {DEFAULT_DATASET}) + [NEW_DATASET_OPTION]
+    # Bộ vừa tạo ở lần chạy trước -> chọn luôn; bộ không còn -> về bộ mặc định
+    if st.session_state.pending_dataset_name in dataset_options:
+        st.session_state.dataset_name = st.session_state.pending_dataset_name
+    st.session_state.pending_dataset_name = None
+    if st.session_state.get("dataset_name") not in dataset_options:
+        st.session_state.dataset_name = DEFAULT_DATASET
+    selected_dataset = st.selectbox(
+        "🗂️ Bộ dữ liệu",
+        dataset_options,
+        key="dataset_name",
+        help="Mỗi bộ dữ liệu (dự án / team / tháng...) có dữ liệu và lịch sử upload riêng"
+    )
+    creating_dataset = selected_dataset == NEW_DATASET_OPTION
+    if creating_dataset:
+        dataset_name = st.text_input(
+            "Tên bộ dữ liệu mới",
+            key="new_dataset_name",
+            help="Chữ, số, khoảng trắng, '-', '_', '.' (tối đa 64 ký tự)"
+        ).strip()
+        if not DATASET_NAME_RE.match(dataset_name):
+            if dataset_name:
+                st.error("❌ Tên bộ dữ liệu không hợp lệ")
+            st.info("👆 Nhập tên bộ dữ liệu mới rồi upload file Excel")
+            st.stop()
+    else:
+        dataset_name = selected_dataset
+
+# === AUTO-LOAD dữ liệu: chuyển session sang phiên bản mới nhất (vd. do session khác / baronbuild.py tạo) ===
+# Registry của bộ dữ liệu chỉ được tạo (load) khi được chọn
+dataset_registry = dataset_catalog.registry(dataset_name)
+try:
+    with rerun_recorder.stage("refresh_dataset"):
+        dataset_registry.refresh()
+except Exception as e:
+    st.error(f"❌ Lỗi khi load dữ liệu: {str(e)}")
+lease = st.session_state.dataset_lease
+if lease is None or lease.name != dataset_name or lease.version != dataset_registry.current_version:
+    # Lease cũ bị hủy -> phiên bản cũ được giải phóng khi không còn session nào xem
+    st.session_state.dataset_lease = dataset_registry.acquire()
+dataset = dataset_registry.get(st.session_state.dataset_lease)
+# Vượt giới hạn bộ nhớ -> bỏ các bộ dữ liệu ít dùng không còn ai xem (load lại khi được chọn)
+dataset_catalog.evict()
+folder_watcher = get_folder_watcher(WATCH_DIR, WATCH_DATASET) if WATCH_DIR else None
+
+# === Sidebar - Upload file ===
+with st.sidebar:
     # Hiển thị thông tin dữ liệu hiện tại
-    if st.session_state.data_loaded and st.session_state.uploaded_filename:
+    if dataset is not None and dataset.uploaded_filename:
         st.markdown(
             '<div class="auto-load-indicator">'
             '🔄 <b>Dữ liệu đang hiển thị</b><br/>'
-            f'📁 File: {st.session_state.uploaded_filename}<br/>'
-            f'🕒 Thời gian: {st.session_state.upload_time.strftime("%Y-%m-%d")}'
+            f'🗂️ Bộ dữ liệu: {dataset.name}<br/>'
+            f'📁 File: {dataset.uploaded_filename}<br/>'
+            f'🕒 Thời gian: {dataset.upload_time.strftime("%Y-%m-%d")}'
             '</div>', 
             unsafe_allow_html=True
         )
     
     st.markdown("---")
     
-    uploaded_file = st.file_uploader(
+    uploaded_files = st.file_uploader(
         "📤 Upload Excel File mới",
         type=["xlsx", "xls"],
-        help="Upload file Excel với header ở dòng 3"
+        accept_multiple_files=True,
+        help="Upload 1 hoặc nhiều file Excel với header ở dòng 3",
+        # Mỗi bộ dữ liệu 1 ô upload riêng: đổi bộ dữ liệu không đưa file đang chọn vào bộ khác
+        key=f"uploaded_files_{dataset_name}"
     )
     
-    if uploaded_file is not None:
-        # AUTO-XÓA dữ liệu cũ
-        if st.session_state.data_loaded:
-            clear_saved_data()
-            st.info("🗑️ Đã xóa dữ liệu cũ tự động")
+    # Mỗi job = (tên file, bytes, tên sheet); file nhiều sheet thì cho chọn sheet
+    upload_jobs = []
+    upload_job_hashes = []
+    if uploaded_files:
+        # Hash mỗi file 1 lần khi được upload, các lần rerun sau dùng lại (chỉ giữ hash của các file đang có)
+        known_hashes = st.session_state.upload_file_hashes
+        st.session_state.upload_file_hashes = {
+            uploaded_file.file_id: known_hashes.get(uploaded_file.file_id) or hash_file_bytes(uploaded_file.getvalue())
+            for uploaded_file in uploaded_files
+        }
+        workbooks = []
+        try:
+            for uploaded_file in uploaded_files:
+                file_bytes = uploaded_file.getvalue()
+                workbook_hash = st.session_state.upload_file_hashes[uploaded_file.file_id]
+                sheet_names, active_sheet = get_sheet_names(workbook_hash, file_bytes)
+                workbooks.append((uploaded_file.name, file_bytes, sheet_names, active_sheet, workbook_hash))
+        except Exception as e:
+            st.error(f"❌ Lỗi khi đọc file: {str(e)}")
+            st.stop()
         
-        st.success("✅ File đã được tải lên!")
+        if any(len(wb[2]) > 1 for wb in workbooks):
+            sheet_options = [(wb_idx, sheet) for wb_idx, wb in enumerate(workbooks) for sheet in wb[2]]
+            selected_sheets = st.multiselect(
+                "📑 Chọn sheet",
+                options=sheet_options,
+                default=[(wb_idx, wb[3]) for wb_idx, wb in enumerate(workbooks)],
+                format_func=lambda option: f"{workbooks[option[0]][0]} / {option[1]}"
+            )
+        else:
+            selected_sheets = [(wb_idx, wb[3]) for wb_idx, wb in enumerate(workbooks)]
+        upload_jobs = [(workbooks[wb_idx][0], workbooks[wb_idx][1], sheet) for wb_idx, sheet in selected_sheets]
+        upload_job_hashes = [workbooks[wb_idx][4] for wb_idx, _ in selected_sheets]
+    
+    # Chỉ xử lý khi nội dung các file / sheet khác với dữ liệu đang hiển thị và chưa xử lý lần nào
+    # (dữ liệu có thể đã được thay bởi session khác / baronbuild.py trong khi file vẫn nằm trong ô upload)
+    file_hash = hash_jobs(upload_jobs, upload_job_hashes) if upload_jobs else None
+    
+    # (upload_hash gồm cả tên bộ dữ liệu: upload lại cùng file vào bộ khác vẫn được xử lý)
+    if (
+        file_hash is not None
+        and file_hash != (dataset.file_hash if dataset is not None else None)
+        and (dataset_name, file_hash) != st.session_state.upload_hash
+    ):
+        st.session_state.upload_hash = (dataset_name, file_hash)
+        # Dữ liệu cũ được giữ lại để so sánh: chỉ tạo thumbnail / ghi hình cho hình mới
+        previous = None
+        if dataset is not None:
+            previous = {"df": dataset.df, "thumbnails": dataset.thumbnails}
         
-        # Load và xử lý dữ liệu
+        st.success(f"✅ Đã tải lên {len(uploaded_files)} file!")
+        
+        # Load và xử lý dữ liệu (song song theo file / sheet)
         try:
-            with st.spinner("⏳ Đang xử lý file..."):
-                df, images, ws, visible_count, total_count = load_and_process_data(uploaded_file)
-                
-                # Lưu vào session state
-                st.session_state.df = df
-                st.session_state.images = images
-                st.session_state.upload_time = datetime.now()
-                st.session_state.uploaded_filename = uploaded_file.name
-                st.session_state.data_loaded = True
-                
-                # AUTO-SAVE dữ liệu
-                if save_dashboard_data(df, images, st.session_state.upload_time, uploaded_file.name):
-                    st.success("💾 Đã lưu dữ liệu tự động!")
-                else:
-                    st.warning("⚠️ Không thể lưu dữ liệu tự động")
-                
+            progress_bar = st.progress(0.0, text="⏳ Đang xử lý file...")
+            
+            def report_progress(done, total, label, error):
+                status = "❌" if error is not None else "✅"
+                progress_bar.progress(done / total, text=f"{status} {label} ({done}/{total})")
+            
+            uploaded_filename = ", ".join(dict.fromkeys(name for name, _, _ in upload_jobs))
+            ingest_recorder = StageRecorder("ingest", label=uploaded_filename)
+            result, ingest_errors = load_and_process_jobs(
+                upload_jobs,
+                on_progress=report_progress,
+                known_image_refs=frozenset(previous["thumbnails"].keys()) if previous is not None else frozenset(),
+                recorder=ingest_recorder,
+                file_hashes=upload_job_hashes
+            )
+            # Giữ lỗi qua st.rerun để hiển thị bên dưới
+            st.session_state.ingest_errors = ingest_errors
+            if result is None:
+                write_metrics(ingest_recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+                st.session_state.last_ingest_metrics = ingest_recorder.to_dict()
                 st.rerun()
             
+            upload_time = datetime.now()
+            
+            # Publish phiên bản mới từ bộ nhớ cho mọi session ngay, AUTO-SAVE chạy ở thread nền
+            try:
+                new_dataset, changes = prepare_dataset(
+                    result, previous, upload_time, uploaded_filename, file_hash,
+                    recorder=ingest_recorder, name=dataset_name
+                )
+                with ingest_recorder.stage("publish_dataset"):
+                    dataset_registry.publish(new_dataset)
+            except Exception as e:
+                write_metrics(ingest_recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+                st.error(f"❌ Lỗi khi xử lý dữ liệu: {str(e)}")
+                st.stop()
+            finally:
+                st.session_state.last_ingest_metrics = ingest_recorder.to_dict()
+            
+            get_background_writer().submit(
+                uploaded_filename, partial(persist_upload, dataset_registry, new_dataset, changes, ingest_recorder)
+            )
+            # Bộ dữ liệu mới đã có dữ liệu -> chọn nó trong ô chọn bộ dữ liệu
+            if creating_dataset:
+                st.session_state.pending_dataset_name = dataset_name
+            st.rerun()
+            
         except Exception as e:
             st.error(f"❌ Lỗi khi đọc file: {str(e)}")
             import traceback
             st.code(traceback.format_exc())
             st.stop()
     
+    # Báo lỗi từng file / sheet của lần xử lý gần nhất
+    for label, message in st.session_state.ingest_errors:
+        st.error(f"❌ {label}: {message}")
+    
+    # Trạng thái ghi dữ liệu ở thread nền
+    background_writer = get_background_writer()
+    if background_writer.pending:
+        st.caption("💾 Đang lưu dữ liệu...")
+    if background_writer.last_error:
+        label, message = background_writer.last_error
+        st.error(f"❌ Lỗi khi lưu dữ liệu ({label}): {message}")
+    
+    # Trạng thái thư mục theo dõi
+    if folder_watcher is not None:
+        last_run = folder_watcher.last_run.strftime("%Y-%m-%d %H:%M:%S") if folder_watcher.last_run else "chưa có"
+        st.caption(f"👀 Theo dõi thư mục: {folder_watcher.input_dir} (xử lý gần nhất: {last_run})")
+        if folder_watcher.last_error:
+            st.error(f"❌ Lỗi khi xử lý thư mục theo dõi: {folder_watcher.last_error}")
+    
     # Sidebar filters
-    if st.session_state.data_loaded:
-        df = st.session_state.df
+    if dataset is not None:
+        df = dataset.df
         
         st.markdown("---")
         st.subheader("🔍 Lọc dữ liệu")
         
+        # STATUS luôn tính lại theo ngày được chọn, không dùng giá trị lúc upload
+        as_of_date = st.date_input(
+            "📅 Tính STATUS tại ngày",
+            value=datetime.now().date(),
+            help="STATUS (New Task/Delay/Working) được tính so với ngày này"
+        )
+        with rerun_recorder.stage("compute_status", rows=len(df)):
+            df = df.assign(STATUS=compute_status(df, as_of_date))
+        
+        # Bộ dữ liệu + phiên bản: khóa cache cho cube thống kê
+        dataset_version = f"{dataset.name}/{dataset.version}"
+        if dataset.status_cube is not None and dataset.cube_as_of == as_of_date:
+            full_cube = dataset.status_cube
+        else:
+            with rerun_recorder.stage("status_cube", rows=len(df)):
+                full_cube = get_status_cube(dataset_version, as_of_date, "", df)
+        
         # Filter theo STATUS
         status_filter = st.multiselect(
             "Chọn STATUS",
-            options=["All"] + sorted(df["STATUS"].unique().tolist()),
+            options=["All"] + sorted(full_cube["STATUS"].unique().tolist()),
             default=["All"]
         )
         
+        # Filter theo Requester (để trống = tất cả)
+        requester_filter = st.multiselect(
+            "Chọn Requester",
+            options=sorted(full_cube["Requester"].dropna().unique().tolist(), key=str),
+            placeholder="Tất cả"
+        )
+        
         # Filter theo TASK (thay vì START DATE)
         task_search = st.text_input(
             "🔎 Tìm kiếm TASK",
             placeholder="Nhập từ khóa để tìm task...",
-            help="Tìm kiếm theo tên task (không phân biệt chữ hoa/thường)"
+            help="Tìm kiếm theo tên task (không phân biệt chữ hoa/thường, có dấu/không dấu). "
+                 "Nhiều từ = task phải chứa tất cả các từ"
+        )
+        search_prefix = st.checkbox(
+            "Khớp đầu từ",
+            value=True,
+            help="Bật: \"cap\" khớp \"cập nhật\", \"capture\"... Tắt: chỉ khớp nguyên từ"
         )
     else:
         st.info("👆 Vui lòng upload file Excel để bắt đầu")
         st.stop()
 
 # === Main content ===
-if st.session_state.data_loaded:
-    df = st.session_state.df
-    images = st.session_state.images
+if dataset is not None:
+    images = dataset.images
+    thumbnails = dataset.thumbnails
     
-    # Áp dụng filter
-    df_filtered = df.copy()
+    # Áp dụng filter: kết quả là mảng vị trí dòng, cache dùng chung mọi session
+    filter_cache = get_filter_cache()
+    selected_statuses = [] if "All" in status_filter else sorted(status_filter)
+    selected_requesters = sorted(requester_filter, key=str)
     
-    # Filter theo STATUS
-    if "All" not in status_filter and len(status_filter) > 0:
-        df_filtered = df_filtered[df_filtered["STATUS"].isin(status_filter)]
+    # Filter theo TASK (text search) qua chỉ mục tìm kiếm
+    search_key = f"{search_prefix}:{normalize_search_text(task_search).strip()}" if task_search else ""
     
-    # Filter theo TASK (text search)
-    if task_search:
-        df_filtered = df_filtered[
-            df_filtered["TASK"].astype(str).str.contains(task_search, case=False, na=False)
-        ]
+    def compute_search_rows():
+        if not task_search:
+            return np.arange(len(df))
+        rows = dataset.search_index.search(task_search, prefix=search_prefix)
+        if rows is None:
+            # Từ khóa không có chữ/số (vd: "#", "-") -> tìm chuỗi con như cũ
+            rows = np.flatnonzero(
+                df["TASK"].astype(str).str.contains(task_search, case=False, na=False, regex=False).to_numpy()
+            )
+        return rows
+    
+    with rerun_recorder.stage("search") as record:
+        search_rows = filter_cache.get_or_compute((dataset_version, "search", search_key), compute_search_rows)
+        record["rows"] = len(search_rows)
+    
+    # Cube thống kê (trước filter STATUS/Requester): filter được áp dụng dạng slice trên cube
+    with rerun_recorder.stage("slice_cube"):
+        status_cube = get_status_cube(dataset_version, as_of_date, search_key, df, search_rows) if search_key else full_cube
+        cube_view = slice_status_cube(status_cube, selected_statuses, selected_requesters)
+        status_totals = cube_view.groupby("STATUS")["count"].sum()
+        total_tasks = int(status_totals.sum())
+    
+    # Filter theo STATUS và Requester
+    filter_key = (dataset_version, "filter", as_of_date, tuple(selected_statuses), tuple(selected_requesters), search_key)
+    with rerun_recorder.stage("filter_rows") as record:
+        filtered_rows = filter_cache.get_or_compute(
+            filter_key, lambda: filter_task_rows(df, search_rows, selected_statuses, selected_requesters)
+        )
+        record["rows"] = len(filtered_rows)
     
     # === Hiển thị thống kê ===
     with st.sidebar:
@@ -369,187 +837,50 @@ if st.session_state.data_loaded:
         
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Tổng số task", len(df_filtered))
-            st.metric("New Task", len(df_filtered[df_filtered["STATUS"] == "New Task"]))
+            st.metric("Tổng số task", total_tasks)
+            st.metric("New Task", int(status_totals.get("New Task", 0)))
         
         with col2:
-            st.metric("Completed", len(df_filtered[df_filtered["STATUS"] == "Completed"]))
-            st.metric("Delay", len(df_filtered[df_filtered["STATUS"] == "Delay"]))
+            st.metric("Completed", int(status_totals.get("Completed", 0)))
+            st.metric("Delay", int(status_totals.get("Delay", 0)))
     
-    # === Tab layout ===
-    tab1, tab2, tab3 = st.tabs(["📊 Biểu đồ", "📋 Bảng dữ liệu", "🖼️ Hình ảnh"])
+    # === Tab layout: chỉ tab đang mở được tính / render, đổi tab thì chạy lại trang ===
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["📊 Biểu đồ", "📋 Bảng dữ liệu", "🖼️ Hình ảnh", "🔄 Thay đổi"], key="main_tab", on_change="rerun"
+    )
     
     # TAB 1: Biểu đồ
-    with tab1:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Tỷ lệ STATUS các Task")
-            st.caption(f"Hiển thị {len(df_filtered)} tasks")
-            status_counts = df_filtered["STATUS"].value_counts()
-            if not status_counts.empty:
-                fig_pie = px.pie(
-                    df_filtered,
-                    names="STATUS",
-                    color="STATUS",
-                    color_discrete_map={
-                        "Completed": "green",
-                        "Working": "orange",
-                        "Delay": "red",
-                        "New Task": "blue"
-                    }
-                )
-                fig_pie.update_traces(textinfo='percent+label', pull=[0.05]*len(status_counts))
-                st.plotly_chart(fig_pie, use_container_width=True)
-            else:
-                st.info("Không có dữ liệu để hiển thị")
-        
-        with col2:
-            st.subheader("Phân bố theo tháng")
-            st.caption(f"Hiển thị {len(df_filtered)} tasks")
-            df_with_dates = df_filtered[df_filtered["START DATE"].notna()].copy()
-            if not df_with_dates.empty:
-                df_with_dates["month"] = df_with_dates["START DATE"].dt.strftime("%Y-%m")
-                df_summary = df_with_dates.groupby(["month", "STATUS"]).size().reset_index(name="count")
-                
-                all_months = sorted(df_summary["month"].unique())
-                all_statuses = ["Completed", "Working", "New Task", "Delay"]
-                
-                full_data = []
-                for month in all_months:
-                    for status in all_statuses:
-                        existing = df_summary[(df_summary["month"] == month) & (df_summary["STATUS"] == status)]
-                        if not existing.empty:
-                            full_data.append({"month": month, "STATUS": status, "count": existing["count"].values[0]})
-                        else:
-                            full_data.append({"month": month, "STATUS": status, "count": 0})
-                
-                df_full = pd.DataFrame(full_data)
-                
-                max_count = df_full["count"].max()
-                
-                fig_bar = go.Figure()
-                colors = {
-                    "Completed": "green",
-                    "Working": "orange",
-                    "New Task": "blue",
-                    "Delay": "red"
-                }
-                
-                for status in all_statuses:
-                    df_status = df_full[df_full["STATUS"] == status]
-                    fig_bar.add_trace(go.Bar(
-                        x=df_status["month"],
-                        y=df_status["count"],
-                        name=status,
-                        marker_color=colors.get(status, "gray"),
-                        text=df_status["count"],
-                        textposition='outside',
-                        textfont=dict(size=10),
-                    ))
-                
-                fig_bar.update_layout(
-                    barmode='group',
-                    xaxis=dict(tickformat="%Y-%m", type='category'),
-                    yaxis=dict(
-                        range=[0, max_count * 1.15]
-                    ),
-                    hovermode='x unified',
-                    height=400,
-                    showlegend=True,
-                    legend=dict(
-                        orientation="h", 
-                        yanchor="bottom", 
-                        y=1.1,
-                        xanchor="right", 
-                        x=1
-                    ),
-                    margin=dict(t=80, b=40, l=40, r=40)
-                )
-                st.plotly_chart(fig_bar, use_container_width=True)
-            else:
-                st.info("Không có dữ liệu ngày tháng để hiển thị")
+    if tab1.open:
+        with tab1, rerun_recorder.stage("tab_charts", rows=total_tasks):
+            render_charts_tab(status_totals, cube_view, total_tasks)
     
-    # TAB 2: Bảng dữ liệu
-    with tab2:
-        st.subheader(f"Danh sách Task ({len(df_filtered)} tasks)")
-        
-        if len(df_filtered) == 0:
-            st.warning("⚠️ Không có task nào khớp với bộ lọc hiện tại")
-        else:
-            df_display = df_filtered.copy()
-            df_display["START DATE"] = df_display["START DATE"].dt.strftime("%m/%d/%Y")
-            df_display["DUE DATE"] = df_display["DUE DATE"].dt.strftime("%m/%d/%Y")
-            df_display = df_display.fillna("")
-            
-            display_cols = ["TASK", "Requester", "START DATE", "DUE DATE", "CONFIRM FROM BARON", "STATUS"]
-            df_show = df_display[display_cols].copy()
-            
-            html_table = "<table style='width:100%; border-collapse: collapse;'>"
-            html_table += "<thead><tr style='background-color: #4CAF50; color: white;'>"
-            for col in display_cols:
-                html_table += f"<th style='padding: 10px; border: 1px solid #ddd;'>{col}</th>"
-            html_table += "</tr></thead><tbody>"
-            
-            for idx, row in df_show.iterrows():
-                html_table += "<tr>"
-                for col in display_cols:
-                    value = str(row[col]) if row[col] != "" else ""
-                    if col == "STATUS":
-                        value = create_status_badge(value)
-                        html_table += f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'>{value}</td>"
-                    else:
-                        html_table += f"<td style='padding: 8px; border: 1px solid #ddd;'>{value}</td>"
-                html_table += "</tr>"
-            
-            html_table += "</tbody></table>"
-            st.markdown(html_table, unsafe_allow_html=True)
-            
-            st.markdown("---")
-            csv = df_show.to_csv(index=False).encode('utf-8-sig')
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"task_dashboard_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-            )
+    # TAB 2: Bảng dữ liệu (bộ lọc đang áp dụng được ghi kèm file xuất)
+    if tab2.open:
+        filter_summary = [
+            ("Dữ liệu", f"{dataset.uploaded_filename} ({dataset.upload_time.strftime('%Y-%m-%d %H:%M:%S')})"),
+            ("Tính STATUS tại ngày", as_of_date.strftime("%m/%d/%Y")),
+            ("STATUS", ", ".join(selected_statuses) or "Tất cả"),
+            ("Requester", ", ".join(map(str, selected_requesters)) or "Tất cả"),
+            ("Tìm kiếm TASK", task_search),
+        ]
+        with tab2, rerun_recorder.stage("tab_table", rows=len(filtered_rows)):
+            render_table_tab(dataset, df, filtered_rows, filter_key, filter_summary)
     
     # TAB 3: Hình ảnh
-    with tab3:
-        st.subheader("Thư viện hình ảnh Task")
-        
-        df_with_images = df_filtered[df_filtered["PICTURE_BASE64"] != ""].copy()
-        
-        if len(df_with_images) > 0:
-            st.info(f"📸 Tìm thấy {len(df_with_images)} task có hình ảnh")
-            
-            cols_per_row = 3
-            rows = (len(df_with_images) + cols_per_row - 1) // cols_per_row
-            
-            for row_idx in range(rows):
-                cols = st.columns(cols_per_row)
-                for col_idx in range(cols_per_row):
-                    img_idx = row_idx * cols_per_row + col_idx
-                    if img_idx < len(df_with_images):
-                        task_row = df_with_images.iloc[img_idx]
-                        with cols[col_idx]:
-                            st.markdown(f"**{task_row['TASK']}**")
-                            st.markdown(f"*Status: {create_status_badge(task_row['STATUS'])}*", unsafe_allow_html=True)
-                            
-                            img_data = task_row["PICTURE_BASE64"]
-                            if img_data:
-                                img_html = f'<img src="data:image/png;base64,{img_data}" style="width:100%; border-radius:8px; border:1px solid #ddd;"/>'
-                                st.markdown(img_html, unsafe_allow_html=True)
-                            
-                            st.markdown("---")
-        else:
-            st.warning("⚠️ Không có task nào có hình ảnh")
+    if tab3.open:
+        with tab3, rerun_recorder.stage("tab_gallery"):
+            render_gallery_tab(dataset, df, filtered_rows, filter_key)
+    
+    # TAB 4: Thay đổi so với lần upload trước
+    if tab4.open:
+        with tab4, rerun_recorder.stage("tab_changes"):
+            render_changes_tab(dataset.name)
     
     # Footer
     st.markdown("---")
     footer_text = f"🔄 Mark Dang - Dashboard cập nhật: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    if st.session_state.upload_time:
-        footer_text += f" | 📁 Dữ liệu: {st.session_state.uploaded_filename} ({st.session_state.upload_time.strftime('%Y-%m-%d %H:%M:%S')})"
+    if dataset.upload_time:
+        footer_text += f" | 📁 Dữ liệu: {dataset.uploaded_filename} ({dataset.upload_time.strftime('%Y-%m-%d %H:%M:%S')})"
     
     st.markdown(
         f"<div style='text-align: center; color: gray; padding: 10px;'>"
@@ -558,4 +889,11 @@ if st.session_state.data_loaded:
         unsafe_allow_html=True
     )
 
+# === Ghi số liệu hiệu năng của lần rerun này ===
+rerun_recorder.finish()
+write_metrics(rerun_recorder, METRICS_WEB_FILE, METRICS_LOG_FILE)
+# Bảng điều khiển chỉ hiện khi mở với ?admin=1 hoặc đặt BARON_ADMIN_PANEL=1
+if st.query_params.get("admin") == "1" or os.environ.get("BARON_ADMIN_PANEL") == "1":
+    with st.sidebar:
+        render_metrics_panel(rerun_recorder)
 
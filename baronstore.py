@@ -0,0 +1,898 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import base64
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import queue
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from baroncore import (
+    hash_file_bytes, hash_image_bytes, make_thumbnail, TaskSearchIndex,
+    ingest_in_parallel, merge_results, complete_thumbnails, diff_datasets, compute_status, build_status_cube,
+    compact_task_frame,
+)
+from baronmetrics import StageRecorder
+
+# =========================================================
+# TASK DASHBOARD - LƯU TRỮ DỮ LIỆU (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# === Đường dẫn lưu dữ liệu ===
+# BARON_DATA_DIR cho phép web app và CLI (baronbuild.py) dùng chung 1 thư mục dữ liệu
+DATA_DIR = Path(os.environ.get("BARON_DATA_DIR", "saved_data"))
+DATA_DIR.mkdir(exist_ok=True)
+# Mỗi bộ dữ liệu có tên (theo dự án / team / tháng...) nằm trong 1 thư mục con của DATASETS_DIR
+DATASETS_DIR = DATA_DIR / "datasets"
+DATASETS_DIR.mkdir(exist_ok=True)
+DEFAULT_DATASET = "dashboard"
+# Tên bộ dữ liệu: chữ (có dấu), số, "_", "-", ".", khoảng trắng; không bắt đầu / kết thúc bằng "." / khoảng trắng
+DATASET_NAME_RE = re.compile(r"^\w(?:[\w .-]{0,62}\w)?$")
+# Tên các file trong thư mục của 1 bộ dữ liệu
+TABLE_FILE = "tasks.arrow"
+IMAGES_FILE = "images.bin"
+IMAGES_INDEX_FILE = "images_index.json"
+THUMBS_FILE = "thumbs.bin"
+THUMBS_INDEX_FILE = "thumbs_index.json"
+SEARCH_INDEX_FILE = "search_index.npz"
+META_FILE = "meta.json"
+# Cube thống kê tính sẵn theo ngày lưu dữ liệu (xem build_status_cube)
+STATUS_CUBE_FILE = "status_cube.arrow"
+# Nhật ký thay đổi giữa các lần upload (mỗi dòng 1 lần upload)
+CHANGES_FILE = "changes.jsonl"
+CHANGE_LOG_MAX_UPLOADS = 50
+CHANGE_LOG_MAX_ROWS = 1000
+
+# Tổng dung lượng các bộ dữ liệu giữ trong bộ nhớ của web (xem DatasetCatalog)
+DATASET_MEMORY_BUDGET = int(os.environ.get("BARON_DATASET_MEMORY_MB", "1024")) * 1024 * 1024
+
+# Thư mục dữ liệu trước khi có nhiều bộ dữ liệu, được chuyển thành bộ DEFAULT_DATASET
+LEGACY_SAVED_DATA_DIR = DATA_DIR / "dashboard"
+# File pickle của phiên bản cũ, chỉ dùng để chuyển đổi sang định dạng mới
+LEGACY_SAVED_DATA_FILE = DATA_DIR / "dashboard_data.pkl"
+
+# === Số liệu thời gian / bộ nhớ từng bước (xem baronmetrics.py) ===
+METRICS_DIR = DATA_DIR / "metrics"
+METRICS_DIR.mkdir(exist_ok=True)
+METRICS_LOG_FILE = METRICS_DIR / "stages.jsonl"
+# Mỗi process ghi 1 file .prom riêng (web / baronbuild.py)
+METRICS_WEB_FILE = METRICS_DIR / "dashboard.prom"
+METRICS_BUILD_FILE = METRICS_DIR / "build.prom"
+
+# === Cache kết quả xử lý theo hash nội dung file ===
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_DIR.mkdir(exist_ok=True)
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+CACHE_MAX_AGE_DAYS = 30
+# Tăng khi định dạng kết quả của load_and_process_data thay đổi
+CACHE_FORMAT_VERSION = 8
+
+# Giữ trong lúc ghi / đọc bộ dữ liệu đã lưu để không load phải bộ dữ liệu đang ghi dở
+# (chỉ trong 1 process: web và baronbuild.py không nên ghi cùng lúc)
+PUBLISH_LOCK = threading.RLock()
+
+# === Kho hình ảnh trên đĩa ===
+class ImageStore:
+    """
+    Kho hình ảnh chỉ đọc: tất cả bytes nằm liền nhau trong 1 file,
+    index {key: (offset, length)} cho biết vị trí từng hình.
+    File được memory-map ngay khi tạo (cùng lúc đọc index), hình chỉ được đọc khi hiển thị:
+    blob bị ghi lại sau đó (file mới, xem replace_file) không làm lệch offset của store này.
+    """
+    
+    def __init__(self, blob_path, index):
+        self.blob_path = Path(blob_path)
+        self.index = index
+        with open(self.blob_path, 'rb') as f:
+            # File rỗng (kho không có hình) không memory-map được
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def keys(self):
+        return self.index.keys()
+    
+    def get(self, key, default=None):
+        if key not in self.index:
+            return default
+        offset, length = self.index[key]
+        return self._mmap[offset:offset + length]
+    
+    @staticmethod
+    def write(images, blob_path, append=False):
+        """
+        Ghi dict {key: bytes} thành 1 file bytes liền nhau
+        
+        Args:
+            append: Ghi nối vào cuối file đang có thay vì ghi đè
+        
+        Returns:
+            Index {key: (offset, length)}
+        """
+        index = {}
+        with open(blob_path, 'ab' if append else 'wb') as f:
+            offset = f.tell()
+            for key, img_bytes in images.items():
+                f.write(img_bytes)
+                index[key] = (offset, len(img_bytes))
+                offset += len(img_bytes)
+        return index
+
+# === HÀM: Ghi / mở kho hình ảnh ===
+def write_image_store(images, blob_path, index_path, previous_index=None):
+    """
+    Ghi dict {key: bytes} ra blob_path + index_path (ghi file tạm rồi đổi tên)
+    
+    Nếu previous_index là index của blob đang lưu ở blob_path: hình đã có được giữ nguyên vị trí,
+    chỉ hình mới được ghi nối vào cuối blob. Blob chỉ được ghi lại toàn bộ (file mới) khi phần
+    hình không còn dùng chiếm quá nửa file.
+    """
+    if previous_index is not None and Path(blob_path).exists():
+        index = {key: previous_index[key] for key in images.keys() if key in previous_index}
+        new_images = {key: images.get(key) for key in images.keys() if key not in index}
+        kept_bytes = sum(length for _, length in index.values())
+        unused_bytes = Path(blob_path).stat().st_size - kept_bytes
+        if unused_bytes <= kept_bytes + sum(map(len, new_images.values())):
+            # Index cũ vẫn trỏ đúng phần đầu file nên session đang đọc không bị ảnh hưởng
+            index.update(ImageStore.write(new_images, blob_path, append=True))
+            replace_file(index_path, lambda path: path.write_text(json.dumps(index), encoding="utf-8"))
+            return
+    
+    index = {}
+    def write_blob(path):
+        index.update(ImageStore.write(images, path))
+    replace_file(blob_path, write_blob)
+    replace_file(index_path, lambda path: path.write_text(json.dumps(index), encoding="utf-8"))
+
+def read_image_index(index_path):
+    """Index {key: (offset, length)} đã ghi bằng write_image_store"""
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    return {key: tuple(value) for key, value in index.items()}
+
+def open_image_store(blob_path, index_path):
+    """
+    Mở ImageStore từ file đã ghi bằng write_image_store. Gọi khi giữ PUBLISH_LOCK
+    để index và blob được memory-map thuộc cùng 1 lần ghi
+    """
+    with PUBLISH_LOCK:
+        return ImageStore(blob_path, read_image_index(index_path))
+
+# === HÀM: Chuẩn hóa bảng trước khi ghi Arrow ===
+def to_arrow_table(df):
+    """Chuyển DataFrame sang Arrow; cột object lẫn nhiều kiểu (số + chữ) được ép về chuỗi"""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+# === HÀM: Ghi file thay thế an toàn ===
+def replace_file(path, write):
+    """
+    Ghi vào file tạm rồi đổi tên, để session khác đang memory-map
+    file cũ không bị đọc dữ liệu đang ghi dở. Tên file tạm riêng theo process / thread
+    nên nhiều nơi ghi cùng lúc không ghi đè file tạm của nhau.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+# === HÀM: Thư mục của 1 bộ dữ liệu ===
+def dataset_dir(name=DEFAULT_DATASET):
+    """
+    Thư mục của bộ dữ liệu name trong DATASETS_DIR (chưa chắc đã tồn tại)
+    
+    Raises:
+        ValueError: Tên không hợp lệ (xem DATASET_NAME_RE)
+    """
+    if not isinstance(name, str) or not DATASET_NAME_RE.match(name):
+        raise ValueError(f"Tên bộ dữ liệu không hợp lệ: {name!r}")
+    path = DATASETS_DIR / name
+    if name == DEFAULT_DATASET and LEGACY_SAVED_DATA_DIR.is_dir():
+        # Kiểm tra lại khi giữ PUBLISH_LOCK: session khác có thể vừa chuyển xong
+        with PUBLISH_LOCK:
+            if LEGACY_SAVED_DATA_DIR.is_dir() and not path.exists():
+                os.replace(LEGACY_SAVED_DATA_DIR, path)
+    return path
+
+# === HÀM: Danh sách bộ dữ liệu đã lưu ===
+def list_datasets():
+    """Tên các bộ dữ liệu đã lưu đủ (có meta.json), sắp theo tên"""
+    # Dữ liệu của phiên bản cũ -> bộ DEFAULT_DATASET
+    migrate_legacy_data_if_needed()
+    return sorted(
+        path.name for path in DATASETS_DIR.iterdir()
+        if DATASET_NAME_RE.match(path.name) and (path / META_FILE).exists()
+    )
+
+# === HÀM: Lưu dữ liệu (Auto) ===
+def save_dashboard_data(df, images, thumbnails, search_index, upload_time, uploaded_filename, file_hash=None,
+                        status_cube=None, name=DEFAULT_DATASET):
+    """
+    Tự động lưu dữ liệu dashboard vào thư mục của bộ dữ liệu name (xem dataset_dir):
+    bảng task dạng Arrow IPC, hình ảnh và thumbnail dạng bytes liền nhau + index,
+    chỉ mục tìm kiếm TASK dạng npz
+    
+    Hình / thumbnail đã có trong dữ liệu đang lưu không bị ghi lại (xem write_image_store).
+    Cube thống kê theo ngày upload_time được tính sẵn luôn (nếu chưa truyền vào status_cube).
+    """
+    folder = dataset_dir(name)
+    folder.mkdir(exist_ok=True)
+    meta = {
+        "upload_time": upload_time.isoformat(),
+        "uploaded_filename": uploaded_filename,
+        "file_hash": file_hash,
+        "cube_as_of": upload_time.date().isoformat()
+    }
+    table = to_arrow_table(df)
+    replace_file(folder / TABLE_FILE, lambda path: feather.write_feather(table, path, compression="uncompressed"))
+    
+    images_file, images_index_file = folder / IMAGES_FILE, folder / IMAGES_INDEX_FILE
+    thumbs_file, thumbs_index_file = folder / THUMBS_FILE, folder / THUMBS_INDEX_FILE
+    previous_images = read_image_index(images_index_file) if images_index_file.exists() else None
+    previous_thumbnails = read_image_index(thumbs_index_file) if thumbs_index_file.exists() else None
+    write_image_store(images, images_file, images_index_file, previous_index=previous_images)
+    write_image_store(thumbnails, thumbs_file, thumbs_index_file, previous_index=previous_thumbnails)
+    replace_file(folder / SEARCH_INDEX_FILE, search_index.save)
+    
+    if status_cube is None:
+        status_cube = build_status_cube(df.assign(STATUS=compute_status(df, upload_time)))
+    replace_file(folder / STATUS_CUBE_FILE, lambda path: feather.write_feather(status_cube, path, compression="uncompressed"))
+    
+    # meta.json ghi sau cùng: có meta nghĩa là bộ dữ liệu đã ghi đủ
+    replace_file(folder / META_FILE, lambda path: path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8"))
+
+# === HÀM: Chuyển file pickle cũ sang định dạng mới ===
+def migrate_legacy_data():
+    """Đọc dashboard_data.pkl của phiên bản cũ, lưu lại thành bộ DEFAULT_DATASET rồi xóa file cũ"""
+    with open(LEGACY_SAVED_DATA_FILE, 'rb') as f:
+        data = pickle.load(f)
+    
+    df = data["df"].drop(columns=["STATUS"], errors="ignore")
+    
+    # PICTURE_BASE64 -> PICTURE_REF (hash nội dung hình trong images)
+    images = {}
+    ref_by_base64 = {}
+    for value in data["images"].values():
+        img_bytes = base64.b64decode(value)
+        ref = hash_image_bytes(img_bytes)
+        images[ref] = img_bytes
+        ref_by_base64[value] = ref
+    if "PICTURE_BASE64" in df:
+        df["PICTURE_REF"] = df.pop("PICTURE_BASE64").map(lambda value: ref_by_base64.get(value, ""))
+    thumbnails = {ref: make_thumbnail(img_bytes) for ref, img_bytes in images.items()}
+    search_index = TaskSearchIndex.build(df["TASK"])
+    
+    save_dashboard_data(df, images, thumbnails, search_index, data["upload_time"], data["uploaded_filename"], data.get("file_hash"))
+    os.remove(LEGACY_SAVED_DATA_FILE)
+
+def migrate_legacy_data_if_needed():
+    """
+    Chuyển dữ liệu phiên bản cũ nếu còn file cũ và bộ DEFAULT_DATASET chưa có dữ liệu.
+    Kiểm tra lại khi đã giữ PUBLISH_LOCK: nhiều session khởi động cùng lúc chỉ 1 session chuyển.
+    """
+    if not LEGACY_SAVED_DATA_FILE.exists():
+        return
+    with PUBLISH_LOCK:
+        if LEGACY_SAVED_DATA_FILE.exists() and not (dataset_dir(DEFAULT_DATASET) / META_FILE).exists():
+            migrate_legacy_data()
+
+# === HÀM: Đọc meta của dữ liệu đã lưu ===
+def read_saved_meta(name=DEFAULT_DATASET):
+    """Nội dung meta.json của bộ dữ liệu name, hoặc None nếu chưa có dữ liệu đã lưu"""
+    meta_file = dataset_dir(name) / META_FILE
+    if not meta_file.exists():
+        return None
+    return json.loads(meta_file.read_text(encoding="utf-8"))
+
+# === HÀM: Load dữ liệu đã lưu (Auto) ===
+def load_saved_data(name=DEFAULT_DATASET):
+    """
+    Tự động load bộ dữ liệu name đã lưu từ file
+    
+    Bảng task được đọc từ file Arrow rồi chuyển thành DataFrame: toàn bộ bảng nằm trong bộ nhớ
+    (memory_map chỉ tránh đọc file vào 1 buffer trung gian trước khi chuyển). Hình ảnh và thumbnail
+    trả về dạng ImageStore memory-map (chỉ đọc bytes khi hiển thị). Các file được mở khi giữ
+    PUBLISH_LOCK nên luôn thuộc cùng 1 lần lưu.
+    
+    Returns:
+        Dict dữ liệu, hoặc None nếu chưa có dữ liệu đã lưu
+    """
+    folder = dataset_dir(name)
+    with PUBLISH_LOCK:
+        if name == DEFAULT_DATASET:
+            migrate_legacy_data_if_needed()
+        meta = read_saved_meta(name)
+        if meta is None:
+            return None
+        
+        # Cột category được lưu dạng dictionary; dữ liệu lưu trước đó được thu gọn lúc load
+        df = compact_task_frame(feather.read_table(folder / TABLE_FILE, memory_map=True).to_pandas())
+        images = open_image_store(folder / IMAGES_FILE, folder / IMAGES_INDEX_FILE)
+        # Dữ liệu lưu trước khi có thumbnail -> dùng luôn hình gốc
+        if (folder / THUMBS_INDEX_FILE).exists():
+            thumbnails = open_image_store(folder / THUMBS_FILE, folder / THUMBS_INDEX_FILE)
+        else:
+            thumbnails = images
+        # Dữ liệu lưu trước khi có chỉ mục tìm kiếm -> tạo lại từ cột TASK
+        if (folder / SEARCH_INDEX_FILE).exists():
+            search_index = TaskSearchIndex.load(folder / SEARCH_INDEX_FILE)
+        else:
+            search_index = TaskSearchIndex.build(df["TASK"])
+        # Dữ liệu lưu trước khi có cube tính sẵn -> web tự tính
+        has_cube = "cube_as_of" in meta and (folder / STATUS_CUBE_FILE).exists()
+        status_cube = feather.read_feather(folder / STATUS_CUBE_FILE) if has_cube else None
+    return {
+        "df": df,
+        "images": images,
+        "thumbnails": thumbnails,
+        "search_index": search_index,
+        "upload_time": datetime.fromisoformat(meta["upload_time"]),
+        "uploaded_filename": meta["uploaded_filename"],
+        "file_hash": meta.get("file_hash"),
+        "status_cube": status_cube,
+        "cube_as_of": datetime.fromisoformat(meta["cube_as_of"]).date() if has_cube else None
+    }
+
+# === Bộ dữ liệu dùng chung giữa các session ===
+@dataclass(frozen=True, eq=False)
+class Dataset:
+    """
+    1 phiên bản dữ liệu đã load, chỉ đọc: mọi session dùng chung cùng 1 object,
+    nên không được sửa df / images / ... tại chỗ (dùng df.assign, .copy() khi cần đổi)
+    """
+    version: str
+    name: str
+    df: pd.DataFrame
+    images: object
+    thumbnails: object
+    search_index: TaskSearchIndex
+    upload_time: datetime
+    uploaded_filename: str
+    file_hash: str
+    status_cube: object
+    cube_as_of: object
+    
+    @classmethod
+    def from_saved(cls, saved, name=DEFAULT_DATASET):
+        """Tạo từ dict của load_saved_data; phiên bản = thời điểm upload"""
+        return cls(version=saved["upload_time"].isoformat(), name=name, **saved)
+
+# === HÀM: Ước lượng bộ nhớ của 1 bộ dữ liệu ===
+def dataset_memory_bytes(dataset):
+    """
+    Số byte mà dataset chiếm trong bộ nhớ: bảng task (luôn nằm trong bộ nhớ) + hình / thumbnail
+    còn nằm trong bộ nhớ (bản load từ đĩa là ImageStore memory-map, không tính)
+    """
+    if dataset is None:
+        return 0
+    total = int(dataset.df.memory_usage(deep=True).sum())
+    for store in (dataset.images, dataset.thumbnails):
+        if isinstance(store, dict):
+            total += sum(len(img_bytes) for img_bytes in store.values())
+    return total
+
+class DatasetLease:
+    """
+    Con trỏ của 1 session tới 1 phiên bản trong DatasetRegistry (chỉ giữ số phiên bản).
+    Phiên bản được giữ trong bộ nhớ đến khi lease cuối cùng trỏ tới nó bị hủy.
+    """
+    
+    def __init__(self, registry, version):
+        self.name = registry.name
+        self.version = version
+        weakref.finalize(self, registry._release, version)
+
+class DatasetRegistry:
+    """
+    Các phiên bản của bộ dữ liệu name đang dùng trong 1 process, mỗi phiên bản chỉ load 1 lần.
+    
+    Phiên bản mới được publish bằng 1 lần đổi con trỏ (giữ lock); session đang xem
+    phiên bản cũ vẫn đọc được đến khi chuyển sang phiên bản mới, sau đó phiên bản cũ
+    được bỏ khỏi registry (bộ nhớ / memory-map được giải phóng khi không còn ai tham chiếu).
+    
+    Phiên bản vừa upload được publish ngay từ bộ nhớ; khi BackgroundWriter ghi xong,
+    refresh() thay nó bằng bản load lại từ đĩa (cùng số phiên bản): bảng task vẫn nằm trong bộ nhớ,
+    hình / thumbnail chuyển sang ImageStore memory-map.
+    """
+    
+    def __init__(self, name=DEFAULT_DATASET):
+        self.name = name
+        self._meta_file = dataset_dir(name) / META_FILE
+        self.current_version = None
+        self._datasets = {}
+        self._sizes = {}
+        self._leases = {}
+        self._meta_stamp = object()
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+    
+    def publish(self, dataset):
+        """Đặt dataset (hoặc None = chưa có dữ liệu) làm phiên bản hiện tại"""
+        size = dataset_memory_bytes(dataset)
+        with self._lock:
+            previous_version = self.current_version
+            if dataset is not None:
+                self._datasets[dataset.version] = dataset
+                self._sizes[dataset.version] = size
+            self.current_version = dataset.version if dataset is not None else None
+            if previous_version != self.current_version:
+                self._drop_if_unused(previous_version)
+    
+    def refresh(self):
+        """
+        Load lại từ đĩa nếu meta.json đã đổi (vd. do session khác / baronbuild.py ghi),
+        chỉ 1 thread load, các thread khác dùng kết quả
+        
+        Returns:
+            True nếu vừa publish phiên bản mới
+        """
+        if self._read_meta_stamp() == self._meta_stamp:
+            return False
+        with self._load_lock, PUBLISH_LOCK:
+            stamp = self._read_meta_stamp()
+            if stamp == self._meta_stamp:
+                return False
+            saved = load_saved_data(self.name)
+            self._meta_stamp = stamp
+        dataset = Dataset.from_saved(saved, self.name) if saved else None
+        with self._lock:
+            if dataset is not None and self.current_version is not None and dataset.version < self.current_version:
+                # Vừa ghi xong 1 phiên bản cũ hơn phiên bản đã publish từ bộ nhớ:
+                # chỉ thay bản trong bộ nhớ bằng bản đọc từ đĩa nếu còn session xem
+                if dataset.version in self._datasets:
+                    self._datasets[dataset.version] = dataset
+                    self._sizes[dataset.version] = dataset_memory_bytes(dataset)
+                return False
+            self.publish(dataset)
+        return True
+    
+    def acquire(self):
+        """Lease trỏ tới phiên bản hiện tại (None nếu chưa có dữ liệu)"""
+        with self._lock:
+            if self.current_version is None:
+                return None
+            self._leases[self.current_version] = self._leases.get(self.current_version, 0) + 1
+            return DatasetLease(self, self.current_version)
+    
+    def current(self):
+        """Dataset hiện tại (None nếu chưa có dữ liệu)"""
+        with self._lock:
+            return self._datasets.get(self.current_version)
+    
+    def get(self, lease):
+        """Dataset mà lease đang trỏ tới"""
+        if lease is None:
+            return None
+        with self._lock:
+            return self._datasets.get(lease.version)
+    
+    def stats(self):
+        """{phiên bản: số lease} của các phiên bản còn giữ trong bộ nhớ"""
+        with self._lock:
+            return {version: self._leases.get(version, 0) for version in self._datasets}
+    
+    def memory_bytes(self):
+        """Tổng bộ nhớ của các phiên bản còn giữ (xem dataset_memory_bytes)"""
+        with self._lock:
+            return sum(self._sizes.get(version, 0) for version in self._datasets)
+    
+    def in_use(self):
+        """True nếu còn session giữ lease tới 1 phiên bản nào đó"""
+        with self._lock:
+            return bool(self._leases)
+    
+    def _read_meta_stamp(self):
+        return self._meta_file.stat().st_mtime_ns if self._meta_file.exists() else None
+    
+    def _release(self, version):
+        with self._lock:
+            self._leases[version] -= 1
+            if self._leases[version] == 0:
+                del self._leases[version]
+                if version != self.current_version:
+                    self._drop_if_unused(version)
+    
+    def _drop_if_unused(self, version):
+        if version is not None and version not in self._leases:
+            self._datasets.pop(version, None)
+            self._sizes.pop(version, None)
+
+class DatasetCatalog:
+    """
+    Các bộ dữ liệu có tên trong 1 process, mỗi bộ 1 DatasetRegistry được tạo (load) khi được chọn lần đầu.
+    
+    Registry được xếp theo lần dùng gần nhất; evict() bỏ các bộ ít dùng nhất không còn session nào xem
+    khi tổng bộ nhớ vượt memory_budget, lần chọn sau bộ đó được load lại từ đĩa.
+    """
+    
+    def __init__(self, memory_budget=DATASET_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._registries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def registry(self, name):
+        """
+        DatasetRegistry của bộ dữ liệu name (tạo mới nếu chưa có), đánh dấu vừa dùng
+        
+        Raises:
+            ValueError: Tên không hợp lệ (xem dataset_dir)
+        """
+        with self._lock:
+            registry = self._registries.get(name)
+            if registry is None:
+                registry = self._registries[name] = DatasetRegistry(name)
+            self._registries.move_to_end(name)
+            return registry
+    
+    def names(self):
+        """Tên các bộ dữ liệu đã lưu + các bộ vừa publish từ bộ nhớ (chưa ghi xong), sắp theo tên"""
+        with self._lock:
+            resident = {name for name, registry in self._registries.items() if registry.current_version is not None}
+        return sorted(resident.union(list_datasets()))
+    
+    def evict(self):
+        """
+        Bỏ các bộ ít dùng nhất (không còn lease) đến khi tổng bộ nhớ <= memory_budget
+        
+        Returns:
+            List tên các bộ đã bỏ
+        """
+        with self._lock:
+            sizes = {name: registry.memory_bytes() for name, registry in self._registries.items()}
+            total = sum(sizes.values())
+            evicted = []
+            for name, registry in list(self._registries.items()):
+                if total <= self.memory_budget:
+                    break
+                if registry.in_use():
+                    continue
+                del self._registries[name]
+                total -= sizes[name]
+                evicted.append(name)
+            return evicted
+    
+    def stats(self):
+        """{tên: (số byte trong bộ nhớ, {phiên bản: số lease})}, ít dùng nhất trước"""
+        with self._lock:
+            registries = list(self._registries.items())
+        return {name: (registry.memory_bytes(), registry.stats()) for name, registry in registries}
+
+# === HÀM: Xóa dữ liệu đã lưu (Auto) ===
+def clear_saved_data(name=DEFAULT_DATASET):
+    """
+    Xóa bộ dữ liệu name đã lưu (nhật ký thay đổi được giữ lại)
+    
+    Returns:
+        True nếu có dữ liệu để xóa
+    """
+    folder = dataset_dir(name)
+    with PUBLISH_LOCK:
+        if not (folder / META_FILE).exists():
+            return False
+        # Xóa meta.json trước để bộ dữ liệu dở dang không bao giờ được load
+        for file_name in (META_FILE, TABLE_FILE, IMAGES_FILE, IMAGES_INDEX_FILE, THUMBS_FILE, THUMBS_INDEX_FILE, SEARCH_INDEX_FILE, STATUS_CUBE_FILE):
+            (folder / file_name).unlink(missing_ok=True)
+        return True
+
+# === HÀM: Ghi nhật ký thay đổi ===
+def append_change_log(changes, upload_time, uploaded_filename, name=DEFAULT_DATASET):
+    """
+    Ghi thêm 1 dòng vào CHANGES_FILE của bộ dữ liệu name cho lần upload này: số task thêm / xóa / sửa
+    và tối đa CHANGE_LOG_MAX_ROWS dòng thay đổi (khóa task + tên cột đổi).
+    Chỉ giữ CHANGE_LOG_MAX_UPLOADS lần upload gần nhất.
+    """
+    counts = changes["CHANGE"].value_counts()
+    rows = changes.head(CHANGE_LOG_MAX_ROWS).astype(object)
+    rows = rows.where(rows.notna(), None)
+    entry = {
+        "upload_time": upload_time.isoformat(),
+        "uploaded_filename": uploaded_filename,
+        "added": int(counts.get("Added", 0)),
+        "removed": int(counts.get("Removed", 0)),
+        "changed": int(counts.get("Changed", 0)),
+        "rows": rows.to_dict("records"),
+    }
+    changes_file = dataset_dir(name) / CHANGES_FILE
+    lines = changes_file.read_text(encoding="utf-8").splitlines() if changes_file.exists() else []
+    lines = lines[-(CHANGE_LOG_MAX_UPLOADS - 1):] + [json.dumps(entry, ensure_ascii=False, default=str)]
+    replace_file(changes_file, lambda path: path.write_text("\n".join(lines) + "\n", encoding="utf-8"))
+
+# === HÀM: Đọc nhật ký thay đổi ===
+def read_change_log(name=DEFAULT_DATASET):
+    """Các lần upload trong CHANGES_FILE của bộ dữ liệu name, mới nhất trước"""
+    changes_file = dataset_dir(name) / CHANGES_FILE
+    if not changes_file.exists():
+        return []
+    entries = []
+    for line in changes_file.read_text(encoding="utf-8").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries[::-1]
+
+# === HÀM: Load kết quả đã xử lý từ cache ===
+def load_cached_result(file_hash):
+    """
+    Lấy kết quả load_and_process_data đã lưu cho file có cùng hash
+    
+    Returns:
+        Tuple kết quả hoặc None nếu chưa có trong cache
+    """
+    cache_file = CACHE_DIR / f"{file_hash}-v{CACHE_FORMAT_VERSION}.pkl"
+    if not cache_file.exists():
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            result = pickle.load(f)
+        # Cập nhật thời gian truy cập để eviction giữ lại entry hay dùng
+        os.utime(cache_file)
+        return result
+    except Exception:
+        # Entry hỏng -> bỏ đi, xử lý lại file
+        cache_file.unlink(missing_ok=True)
+        return None
+
+# === HÀM: Lưu kết quả đã xử lý vào cache ===
+def save_cached_result(file_hash, result):
+    """Lưu kết quả load_and_process_data vào cache rồi dọn các entry cũ"""
+    cache_file = CACHE_DIR / f"{file_hash}-v{CACHE_FORMAT_VERSION}.pkl"
+    
+    def write_cache(path):
+        with open(path, 'wb') as f:
+            pickle.dump(result, f)
+    
+    try:
+        # Upload và folder watcher có thể cùng ghi 1 file: mỗi nơi ghi file tạm riêng
+        replace_file(cache_file, write_cache)
+    except Exception:
+        return False
+    evict_cache()
+    return True
+
+# === HÀM: Dọn cache theo tuổi và dung lượng ===
+def evict_cache(max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+    """
+    Xóa các entry cache quá cũ, sau đó xóa entry ít dùng nhất
+    cho đến khi tổng dung lượng <= max_bytes
+    """
+    now = datetime.now().timestamp()
+    entries = []
+    for cache_file in CACHE_DIR.glob("*.pkl"):
+        try:
+            stat = cache_file.stat()
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime > max_age_days * 86400:
+            cache_file.unlink(missing_ok=True)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, cache_file))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, cache_file in sorted(entries):
+        if total <= max_bytes:
+            break
+        cache_file.unlink(missing_ok=True)
+        total -= size
+
+# === HÀM: Load nhiều workbook / sheet qua cache ===
+def load_and_process_jobs(jobs, on_progress=None, known_image_refs=frozenset(), max_workers=None, recorder=None,
+                          file_hashes=None):
+    """
+    Xử lý nhiều job (tên file, bytes, tên sheet): job đã có trong cache lấy ra luôn,
+    các job còn lại chạy song song trên process pool rồi lưu cache
+    
+    Args:
+        jobs: List (file_name, file_bytes, sheet_name)
+        on_progress: Hàm gọi lại (số job xong, tổng số job, nhãn job, exception hoặc None)
+        known_image_refs: Khóa các hình đã có thumbnail (xem load_and_process_data)
+        max_workers: Số process tối đa (default=số CPU)
+        recorder: StageRecorder ghi thời gian / bộ nhớ (các bước của từng job có thêm trường job)
+        file_hashes: hash_file_bytes của từng job nếu đã tính sẵn (None = tính lại từ bytes)
+    
+    Returns:
+        (kết quả đã gộp hoặc None nếu mọi job lỗi, list (nhãn job, thông báo lỗi))
+    """
+    recorder = recorder if recorder is not None else StageRecorder("ingest")
+    
+    def job_label(job):
+        return f"{job[0]} / {job[2]}"
+    
+    results = [None] * len(jobs)
+    with recorder.stage("cache_lookup", rows=len(jobs)) as record:
+        job_hashes = [
+            hashlib.sha256(f"{file_hash}:{sheet_name}".encode("utf-8")).hexdigest()
+            for file_hash, (_, _, sheet_name) in zip(job_file_hashes(jobs, file_hashes), jobs)
+        ]
+        pending = []
+        for job_idx, job in enumerate(jobs):
+            results[job_idx] = load_cached_result(job_hashes[job_idx])
+            if results[job_idx] is None:
+                pending.append(job_idx)
+        record["cache_hits"] = len(jobs) - len(pending)
+    
+    done = len(jobs) - len(pending)
+    errors = []
+    with recorder.stage("process_jobs", rows=len(pending)):
+        for pending_idx, job_result, error in ingest_in_parallel(
+            [jobs[job_idx] for job_idx in pending], max_workers=max_workers, known_image_refs=known_image_refs
+        ):
+            job_idx = pending[pending_idx]
+            done += 1
+            if error is None:
+                results[job_idx], job_records = job_result
+                recorder.extend(job_records, job=job_label(jobs[job_idx]))
+                save_cached_result(job_hashes[job_idx], results[job_idx])
+            else:
+                errors.append((job_label(jobs[job_idx]), f"{type(error).__name__}: {error}"))
+            if on_progress is not None:
+                on_progress(done, len(jobs), job_label(jobs[job_idx]), error)
+    
+    # Cache theo nội dung file: cùng bytes có thể được upload với tên khác -> SOURCE FILE lấy theo job
+    results = [
+        with_source_name(result, jobs[job_idx][0]) for job_idx, result in enumerate(results) if result is not None
+    ]
+    with recorder.stage("merge_results", rows=len(results)):
+        merged = merge_results(results) if results else None
+    return merged, errors
+
+# === HÀM: Gán tên file nguồn cho kết quả xử lý ===
+def with_source_name(result, source_name):
+    """Kết quả load_and_process_data với cột SOURCE FILE = source_name (bảng mới, kết quả trong cache không đổi)"""
+    df = result[0]
+    df = df.assign(**{"SOURCE FILE": pd.Categorical([source_name] * len(df))})
+    return (df,) + tuple(result[1:])
+
+# === HÀM: Khóa của 1 bộ job ===
+def hash_jobs(jobs, file_hashes=None):
+    """
+    Hash của bộ (nội dung file, tên sheet): giống nhau nghĩa là dữ liệu đầu vào không đổi
+    
+    Args:
+        file_hashes: hash_file_bytes của từng job nếu đã tính sẵn (None = tính lại từ bytes)
+    """
+    return hashlib.sha256("\n".join(
+        f"{file_hash}:{sheet_name}" for file_hash, (_, _, sheet_name) in zip(job_file_hashes(jobs, file_hashes), jobs)
+    ).encode("utf-8")).hexdigest()
+
+def job_file_hashes(jobs, file_hashes=None):
+    """hash_file_bytes của từng job: dùng file_hashes nếu có, không thì hash bytes của job"""
+    if file_hashes is not None:
+        return file_hashes
+    return [hash_file_bytes(file_bytes) for _, file_bytes, _ in jobs]
+
+# === HÀM: Tạo bộ dữ liệu mới từ kết quả xử lý ===
+def prepare_dataset(result, previous, upload_time, uploaded_filename, file_hash, recorder=None, name=DEFAULT_DATASET):
+    """
+    Phần trong bộ nhớ của publish_result: bổ sung thumbnail, so sánh với dữ liệu trước
+    và tính sẵn cube thống kê theo ngày upload_time
+    
+    Args:
+        previous: Dict có "df" và "thumbnails" của dữ liệu đang dùng (None nếu chưa có)
+    
+    Returns:
+        (Dataset dùng được ngay, DataFrame các dòng thay đổi)
+    """
+    recorder = recorder if recorder is not None else StageRecorder("ingest")
+    df, images, thumbnails, search_index, _, _ = result
+    with recorder.stage("complete_thumbnails", rows=len(images)):
+        thumbnails = complete_thumbnails(images, thumbnails, previous["thumbnails"] if previous else None)
+    with recorder.stage("diff_datasets", rows=len(df)):
+        changes = diff_datasets(previous["df"] if previous else pd.DataFrame(), df)
+    with recorder.stage("status_cube", rows=len(df)):
+        status_cube = build_status_cube(df.assign(STATUS=compute_status(df, upload_time)))
+    dataset = Dataset(
+        version=upload_time.isoformat(),
+        name=name,
+        df=df,
+        images=images,
+        thumbnails=thumbnails,
+        search_index=search_index,
+        upload_time=upload_time,
+        uploaded_filename=uploaded_filename,
+        file_hash=file_hash,
+        status_cube=status_cube,
+        cube_as_of=upload_time.date()
+    )
+    return dataset, changes
+
+# === HÀM: Ghi bộ dữ liệu ra đĩa ===
+def persist_dataset(dataset, changes, recorder=None):
+    """
+    Lưu Dataset của prepare_dataset vào bộ dữ liệu dataset.name rồi ghi nhật ký thay đổi (giữ PUBLISH_LOCK)
+    
+    Returns:
+        False nếu bỏ qua vì trên đĩa đã có phiên bản mới hơn (vd. do process khác ghi trước)
+    """
+    recorder = recorder if recorder is not None else StageRecorder("ingest")
+    with PUBLISH_LOCK:
+        saved_meta = read_saved_meta(dataset.name)
+        if saved_meta is not None and datetime.fromisoformat(saved_meta["upload_time"]) > dataset.upload_time:
+            return False
+        with recorder.stage("save_dashboard_data", rows=len(dataset.df)):
+            save_dashboard_data(
+                dataset.df, dataset.images, dataset.thumbnails, dataset.search_index,
+                dataset.upload_time, dataset.uploaded_filename, dataset.file_hash, dataset.status_cube, dataset.name
+            )
+        with recorder.stage("change_log", rows=len(changes)):
+            append_change_log(changes, dataset.upload_time, dataset.uploaded_filename, dataset.name)
+    return True
+
+# === HÀM: Lưu kết quả xử lý thành bộ dữ liệu mới ===
+def publish_result(result, previous, upload_time, uploaded_filename, file_hash, recorder=None, name=DEFAULT_DATASET):
+    """
+    Lưu kết quả của load_and_process_jobs (dùng chung cho web và baronbuild.py):
+    bổ sung thumbnail, so sánh với dữ liệu trước, lưu dữ liệu rồi ghi nhật ký thay đổi
+    
+    Args:
+        previous: Dict có "df" và "thumbnails" của dữ liệu đang lưu (None nếu chưa có)
+        recorder: StageRecorder ghi thời gian / bộ nhớ từng bước
+        name: Tên bộ dữ liệu được lưu (xem dataset_dir)
+    
+    Returns:
+        DataFrame các dòng thay đổi (xem diff_datasets)
+    """
+    recorder = recorder if recorder is not None else StageRecorder("ingest")
+    dataset, changes = prepare_dataset(result, previous, upload_time, uploaded_filename, file_hash, recorder, name)
+    persist_dataset(dataset, changes, recorder)
+    return changes
+
+# === Ghi dữ liệu ở thread nền ===
+class BackgroundWriter:
+    """
+    1 thread nền ghi lần lượt các việc được submit (theo đúng thứ tự),
+    để web trả kết quả ngay khi dữ liệu đã dùng được trong bộ nhớ
+    """
+    
+    def __init__(self):
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, label, write):
+        """Đưa write() vào hàng đợi ghi; lỗi được giữ ở last_error = (label, thông báo)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="baron-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((label, write))
+    
+    @property
+    def pending(self):
+        """Số việc chưa ghi xong"""
+        return self._queue.unfinished_tasks
+    
+    def wait(self):
+        """Chờ ghi xong mọi việc đã submit"""
+        self._queue.join()
+    
+    def _run(self):
+        while True:
+            label, write = self._queue.get()
+            try:
+                write()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = (label, str(e))
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,169 @@
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+import plotly.express as px
+import html
+from baroncore import decategorize
+
+# =========================================================
+# TASK DASHBOARD - BIỂU ĐỒ / BẢNG (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# === STATUS ===
+STATUS_ORDER = ["Completed", "Working", "New Task", "Delay"]
+STATUS_COLORS = {
+    "Completed": "green",
+    "Working": "orange",
+    "New Task": "blue",
+    "Delay": "red"
+}
+
+# === Bảng dữ liệu ===
+DISPLAY_COLS = ["TASK", "Requester", "START DATE", "DUE DATE", "CONFIRM FROM BARON", "STATUS"]
+# Cột nguồn, chỉ hiện khi dữ liệu gộp từ nhiều file / sheet
+SOURCE_COLS = ["SOURCE FILE", "SHEET"]
+
+# === HÀM: Lọc cube thống kê ===
+def slice_status_cube(cube, statuses=None, requesters=None):
+    """Áp dụng filter STATUS / Requester trực tiếp trên cube (None hoặc rỗng = tất cả)"""
+    mask = pd.Series(True, index=cube.index)
+    if statuses:
+        mask &= cube["STATUS"].isin(statuses)
+    if requesters:
+        mask &= cube["Requester"].isin(requesters)
+    return cube[mask]
+
+# === HÀM: Lọc dòng theo filter ===
+def filter_task_rows(df, rows, statuses=None, requesters=None):
+    """
+    Lọc tiếp mảng vị trí dòng rows theo STATUS / Requester (None hoặc rỗng = tất cả)
+    
+    Chỉ đọc các cột cần lọc tại các vị trí rows, không copy bảng
+    """
+    if statuses:
+        rows = rows[np.isin(df["STATUS"].to_numpy()[rows], statuses)]
+    if requesters:
+        rows = rows[df["Requester"].iloc[rows].isin(requesters).to_numpy()]
+    return rows
+
+# === HÀM: Sắp xếp bảng task ===
+def sort_task_rows(df, rows, sort_col, ascending=True):
+    """
+    Sắp xếp mảng vị trí dòng rows theo sort_col (ô trống luôn nằm cuối)
+    
+    Chỉ sắp xếp 1 cột, không copy cả bảng; cột lẫn số và chữ được so sánh dạng chuỗi
+    """
+    keys = decategorize(df[sort_col].iloc[rows].reset_index(drop=True))
+    if keys.dtype == object:
+        keys = keys.where(keys.isna(), keys.astype(str).str.lower())
+    order = keys.sort_values(ascending=ascending, na_position="last", kind="stable").index.to_numpy()
+    return rows[order]
+
+# === HÀM: Định dạng các dòng để hiển thị / xuất file ===
+def format_task_rows(df_page, display_cols=DISPLAY_COLS):
+    """Chỉ các cột display_cols, ngày dạng mm/dd/yyyy, ô trống = "" (kiểu object)"""
+    df_page = df_page[display_cols].copy()
+    for col in ("START DATE", "DUE DATE"):
+        if col in df_page and pd.api.types.is_datetime64_any_dtype(df_page[col]):
+            df_page[col] = df_page[col].dt.strftime("%m/%d/%Y")
+    return df_page.astype(object).fillna("")
+
+# === HÀM: Tạo HTML cho 1 trang bảng task ===
+def render_task_table_html(df_page, display_cols=DISPLAY_COLS):
+    """Tạo bảng HTML chỉ cho các dòng của trang đang xem"""
+    df_page = format_task_rows(df_page, display_cols)
+    
+    parts = ["<table style='width:100%; border-collapse: collapse;'>"]
+    parts.append("<thead><tr style='background-color: #4CAF50; color: white;'>")
+    for col in display_cols:
+        parts.append(f"<th style='padding: 10px; border: 1px solid #ddd;'>{col}</th>")
+    parts.append("</tr></thead><tbody>")
+    
+    for row in df_page.itertuples(index=False):
+        parts.append("<tr>")
+        for col, value in zip(display_cols, row):
+            if col == "STATUS":
+                parts.append(f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'>{create_status_badge(value)}</td>")
+            else:
+                parts.append(f"<td style='padding: 8px; border: 1px solid #ddd;'>{html.escape(str(value))}</td>")
+        parts.append("</tr>")
+    
+    parts.append("</tbody></table>")
+    return "".join(parts)
+
+def create_status_badge(status):
+    """Tạo badge HTML cho status"""
+    if status == "Completed":
+        return '<span class="status-completed">✓ Completed</span>'
+    elif status == "Working":
+        return '<span class="status-working">⚙️ Working</span>'
+    elif status == "Delay":
+        return '<span class="status-delay">⚠️ Delay</span>'
+    elif status == "New Task":
+        return '<span class="status-newtask">🆕 New Task</span>'
+    return status
+
+# === HÀM: Biểu đồ tròn STATUS ===
+def build_status_pie(status_counts):
+    """Biểu đồ tròn từ Series số task theo STATUS (tên Series = "count", chỉ các STATUS > 0)"""
+    fig_pie = px.pie(
+        status_counts.reset_index(),
+        names="STATUS",
+        values="count",
+        color="STATUS",
+        color_discrete_map=STATUS_COLORS
+    )
+    fig_pie.update_traces(textinfo='percent+label', pull=[0.05]*len(status_counts))
+    return fig_pie
+
+# === HÀM: Biểu đồ phân bố theo tháng ===
+def build_monthly_chart(cube_view):
+    """
+    Biểu đồ cột tháng × STATUS từ cube thống kê đã lọc
+    
+    Returns:
+        go.Figure, hoặc None nếu không có task nào có START DATE
+    """
+    cube_with_dates = cube_view[cube_view["month"].notna()]
+    if cube_with_dates.empty:
+        return None
+    
+    # Bảng tháng × STATUS, ô thiếu = 0
+    df_full = cube_with_dates.pivot_table(
+        index="month", columns="STATUS", values="count", aggfunc="sum", fill_value=0
+    ).reindex(columns=STATUS_ORDER, fill_value=0).sort_index()
+    
+    max_count = df_full.to_numpy().max()
+    
+    fig_bar = go.Figure()
+    
+    for status in STATUS_ORDER:
+        fig_bar.add_trace(go.Bar(
+            x=df_full.index,
+            y=df_full[status],
+            name=status,
+            marker_color=STATUS_COLORS.get(status, "gray"),
+            text=df_full[status],
+            textposition='outside',
+            textfont=dict(size=10),
+        ))
+    
+    fig_bar.update_layout(
+        barmode='group',
+        xaxis=dict(tickformat="%Y-%m", type='category'),
+        yaxis=dict(
+            range=[0, max_count * 1.15]
+        ),
+        hovermode='x unified',
+        height=400,
+        showlegend=True,
+        legend=dict(
+            orientation="h", 
+            yanchor="bottom", 
+            y=1.1,
+            xanchor="right", 
+            x=1
+        ),
+        margin=dict(t=80, b=40, l=40, r=40)
+    )
+    return fig_bar
@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from baronbuild import find_input_files, build_jobs
+from baronstore import hash_jobs
+
+# =========================================================
+# TASK DASHBOARD - THEO DÕI THƯ MỤC FILE EXCEL (KHÔNG PHỤ THUỘC STREAMLIT)
+# =========================================================
+
+# === Theo dõi thư mục ===
+# Chu kỳ quét thư mục (giây)
+WATCH_INTERVAL_SECONDS = 5
+# File phải đứng yên (không đổi kích thước / thời gian sửa) trong khoảng này mới được xử lý,
+# để không đọc file đang được lưu / đồng bộ dở
+WATCH_DEBOUNCE_SECONDS = 10
+
+class FolderWatcher:
+    """
+    Thread nền quét input_dir định kỳ. Khi các file .xlsx thay đổi và đứng yên đủ lâu,
+    file được đọc, hash nội dung (hash_jobs); nội dung mới thì gọi on_change(jobs, file_hash)
+    trên chính thread này. Chỉ lưu / đổi tên file mà nội dung không đổi thì bỏ qua.
+    """
+    
+    def __init__(self, input_dir, on_change, all_sheets=False,
+                 interval=WATCH_INTERVAL_SECONDS, debounce=WATCH_DEBOUNCE_SECONDS):
+        self.input_dir = Path(input_dir)
+        self.on_change = on_change
+        self.all_sheets = all_sheets
+        self.interval = interval
+        self.debounce = debounce
+        self.last_hash = None
+        self.last_run = None
+        self.last_error = None
+        self._snapshot = None
+        self._changed_at = None
+        self._processed_snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Chạy thread theo dõi (daemon)"""
+        self._thread = threading.Thread(target=self._run, name="baron-watcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def scan(self):
+        """
+        1 lần quét: xử lý nếu các file đã đổi và đứng yên ít nhất debounce giây
+        
+        Returns:
+            True nếu đã gọi on_change
+        """
+        paths = find_input_files(self.input_dir) if self.input_dir.is_dir() else []
+        snapshot = tuple((path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in paths)
+        now = time.monotonic()
+        if snapshot != self._snapshot:
+            self._snapshot = snapshot
+            self._changed_at = now
+        if snapshot == self._processed_snapshot or now - self._changed_at < self.debounce:
+            return False
+        
+        # Đánh dấu đã xử lý trước: file lỗi chỉ được thử lại khi file thay đổi
+        self._processed_snapshot = snapshot
+        if not paths:
+            return False
+        jobs, errors = build_jobs(paths, self.all_sheets)
+        if errors:
+            raise RuntimeError("; ".join(f"{name}: {message}" for name, message in errors))
+        file_hash = hash_jobs(jobs)
+        if file_hash == self.last_hash:
+            return False
+        self.on_change(jobs, file_hash)
+        self.last_hash = file_hash
+        self.last_run = datetime.now()
+        return True
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.scan():
+                    self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._stop.wait(self.interval)